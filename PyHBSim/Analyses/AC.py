@@ -6,16 +6,33 @@ import scipy.sparse.linalg
 
 from PyHBSim.Devices import *
 from PyHBSim.Analyses import DC
-from PyHBSim.Analyses.Solver import solve_linear
+from PyHBSim.Analyses.Solver import LinearSolver
+from PyHBSim.Analyses.StampPlan import StampPlan
 from PyHBSim.Utils import ac_logger as logger
 
 import logging
 logger.setLevel(logging.WARNING)
 
 options = dict()
-options['is_sparse'] = False
+options['is_sparse'] = 'auto'   # True, False or 'auto' (by the size of the circuit)
 options['max_iterations'] = 150
 options['gmin'] = 1e-12
+options['batch_size'] = 2**20   # matrix entries solved at once by the dense (batched) solver
+
+# sweep method: 'direct' solves the full system at every frequency, 'mor'
+# evaluates a reduced order model (see solve_ac_mor)
+options['sweep_method'] = 'direct'
+options['mor_order'] = 8            # Krylov vectors added per expansion point
+options['mor_max_points'] = 10      # maximum number of expansion points
+options['mor_reltol'] = 1e-8        # relative residual the reduced model has to reach
+options['mor_check_points'] = 200   # frequencies the residual is followed at while adding expansion points
+
+# adaptive sweep (sweeptype='adaptive'): starts from 'numpts' points and
+# refines the intervals where the response changes fast or that hide a
+# resonance (see refine_freqs)
+options['adaptive_magtol'] = 0.01   # change of |x| between neighbours, relative to the peak of |x|
+options['adaptive_phasetol'] = 5.   # change of the phase between neighbours (degrees)
+options['adaptive_max_points'] = 2000
 
 # convergence parameters
 options['reltol'] = 1e-3
@@ -30,6 +47,7 @@ class AC():
         # output data
         self.xac = None
         self.xdc = None
+        self.expansion_points = [] # frequencies of the reduced order model
 
         # analysis parameters
         self.start = start
@@ -78,46 +96,253 @@ class AC():
         # Here we go!
         logger.info('Starting AC analysis.')
 
-        # create MNA matrices
-        A = np.zeros((self.n+self.m, self.n+self.m), dtype=complex)
-        z = np.zeros((self.n+self.m, 1), dtype=complex)
+        # create MNA matrices: the devices with constant stamps go to the G
+        # and C matrices of the plan, and gmin is added to all nodes from a
+        # layer of its own, so only the other devices (sources, nonlinear
+        # and delayed devices) are stamped at each frequency
+        solver = LinearSolver(self.name, self.n+self.m-1, self.options['is_sparse'])
+        plan = StampPlan(self.name, self.n+self.m, complex, solver.is_sparse)
+        devs = plan.add_devices(self.devs, self.iidx)
+        Agmin = plan.new_layer()
+        for i in range(self.n+self.m):
+            Agmin[i,i] = self.options['gmin']
 
         # create array with frequencies to be simulated
         self.create_freqs_array()
+        self.solve_ac(plan, solver, devs, Agmin)
 
+        # adaptive sweep: only the new frequencies are solved at each pass
+        if self.sweeptype == 'adaptive':
+            freqs, xac = self.freqs, self.xac
+            while len(freqs) < self.options['adaptive_max_points']:
+                self.freqs = self.refine_freqs(freqs, xac)
+                if len(self.freqs) == 0:
+                    break
+                self.freqs = self.freqs[:self.options['adaptive_max_points'] - len(freqs)]
+                self.solve_ac(plan, solver, devs, Agmin)
+                freqs = np.concatenate((freqs, self.freqs))
+                xac = np.concatenate((xac, self.xac))
+                order = np.argsort(freqs)
+                freqs, xac = freqs[order], xac[order]
+            else:
+                logger.warning('{}: adaptive sweep stopped at {} points.'.format(self.name, len(freqs)))
+            self.freqs, self.xac = freqs, xac
+
+        logger.info('Finished AC analysis.')
+        return self.xac
+
+    def solve_ac(self, plan, solver, devs, Agmin):
         # create matrix to hold the AC solution
-        self.xac = np.empty((len(self.freqs), len(z)-1), dtype=complex)
+        self.xac = np.zeros((len(self.freqs), self.n+self.m-1), dtype=complex)
+
+        issolved = False
+        if self.options['sweep_method'] == 'mor':
+            issolved = self.solve_ac_mor(plan, solver.is_sparse, devs, Agmin)
+        if not issolved:
+            if solver.is_sparse:
+                self.solve_ac_sparse(plan, solver, devs, Agmin)
+            else:
+                self.solve_ac_batched(plan, devs, Agmin)
+
+    def solve_ac_batched(self, plan, devs, Agmin):
+        # (G + s C + A(f)) x = z(f) for a batch of frequencies at a time:
+        # the devices stamp each frequency into its slice of the stacked
+        # matrices, which are solved by a single call to the LAPACK solver
+        G = plan.get_matrix([plan.G, Agmin])
+        C = plan.get_matrix([plan.C])
+        size = plan.size
+        batch = max(1, self.options['batch_size'] // size**2)
+
+        for k0 in range(0, len(self.freqs), batch):
+            freqs = self.freqs[k0:k0+batch]
+            A = np.zeros((len(freqs), size, size), dtype=complex)
+            z = np.zeros((len(freqs), size, 1), dtype=complex)
+            for k, freq in enumerate(freqs):
+                for dev in devs:
+                    idx = self.iidx[dev] if dev in self.iidx else None
+                    dev.add_ac_stamps(A[k], z[k], None, idx, freq)
+
+            # index slicing is used to remove the 'gnd' node
+            s = 1j * 2 * np.pi * freqs
+            An = A[:,1:,1:] + G + s[:,None,None] * C
+            try:
+                xac = np.linalg.solve(An, z[:,1:])
+            except np.linalg.LinAlgError:
+                # some matrix of the batch is singular
+                xac = np.full(z[:,1:].shape, np.nan, dtype=complex)
+                for k in range(len(freqs)):
+                    try:
+                        xac[k] = np.linalg.solve(An[k], z[k,1:])
+                    except np.linalg.LinAlgError:
+                        pass
+
+            # add the solved frequencies to the output, the others are left
+            # at zero with an error log
+            issolved = ~np.isnan(np.sum(xac, axis=(1,2)))
+            self.xac[k0:k0+len(freqs)][issolved] = xac[issolved,:,0]
+            for freq in freqs[~issolved]:
+                logger.error('Failed to solve AC for frequency {}!'.format(freq))
+
+    def solve_ac_sparse(self, plan, solver, devs, Agmin):
+        A = plan.new_layer()
+        z = A.z
 
         k = 0
         for freq in self.freqs:
             # refresh the MNA matrices
-            A[:][:] = 0
-            z[:] = 0
+            A.clear()
 
             # populate the matrices A and z with the devices stamps
-            for dev in self.devs:
+            for dev in devs:
                 idx = self.iidx[dev] if dev in self.iidx else None
-                dev.add_ac_stamps(A, z, None, idx, freq)
-
-            # adding gmin to all nodes
-            A = A + np.eye(len(A)) * self.options['gmin']
+                dev.add_ac_stamps(A.A, z, None, idx, freq)
 
             # solve complex linear system
-            xac, issolved = solve_linear(A[1:,1:], z[1:], self.options['is_sparse'])
+            s = 1j * 2 * np.pi * freq
+            An = plan.get_matrix([plan.G, plan.C, A, Agmin], [1., s, 1., 1.])
+            xac, issolved = solver.solve(An, z[1:])
 
             # linear system is solved: add the solution to output
-            # otherwise: add zeroes as solution and issue error log
+            # otherwise: leave zeroes as solution and issue error log
             if issolved:
                 self.xac[k] = np.transpose(xac)
             else:
-                self.xac[k] = np.zeros((1, len(z)-1))
-                logger.error('Failed to solve AC for frequency {}!', freq)
+                logger.error('Failed to solve AC for frequency {}!'.format(freq))
 
-            logger.debug('A:\n{}\nz:\n{}\nxac\n{}'.format(A[1:,1:], z[1:], xac))
+            logger.debug('A:\n{}\nz:\n{}\nxac\n{}'.format(An, z[1:], xac))
             k = k + 1
 
-        logger.info('Finished AC analysis.')
-        return self.xac
+    def solve_ac_mor(self, plan, is_sparse, devs, Agmin):
+        # Fast sweep on a reduced order model of (G + s C) x = z. The
+        # solution is searched in the rational Krylov space V spanned by
+        # (K^-1 C)^i K^-1 z, K = G + s0 C, of a few expansion points s0,
+        # which contains the first moments of x(s) around each of them. At
+        # each frequency x = V y minimizes the residual of the full system,
+        # which is available over the whole sweep from one QR factorization,
+        # so a new expansion point is added where it is largest until it
+        # drops below 'mor_reltol'. Returns False when the circuit is not of
+        # that form or the model does not converge.
+        self.expansion_points = []
+        if len(self.freqs) < 2:
+            return False
+
+        # delayed sources are not rational in s, and a check at a few
+        # frequencies can miss exp(-j w tau) wrapping around
+        if any(getattr(dev, 'tau', 0.) != 0. for dev in devs):
+            logger.warning('{}: delayed sources are not of the form G + s C, using the direct sweep.'.format(self.name))
+            return False
+
+        # the devices that are not in the plan are stamped at the ends of
+        # the sweep to split them into G and C, and the split is checked
+        # against the interpolation of the two at a third frequency
+        f1, f2 = np.min(self.freqs), np.max(self.freqs)
+        f3 = np.sqrt(f1 * f2) if f1 > 0 else f2 / 2.
+        layers = []
+        for freq in (f1, f2, f3):
+            layer = plan.new_layer()
+            for dev in devs:
+                idx = self.iidx[dev] if dev in self.iidx else None
+                dev.add_ac_stamps(layer.A, layer.z, None, idx, freq)
+            layers.append(layer)
+        s1, s2, s3 = 1j * 2 * np.pi * np.array([f1, f2, f3])
+        w = 1. / (s2 - s1)
+        G = plan.get_matrix([plan.G, Agmin] + layers[:2], [1., 1., s2 * w, -s1 * w])
+        C = plan.get_matrix([plan.C] + layers[:2], [1., -w, w])
+        D = plan.get_matrix(layers, [-(s2 - s3) * w, -(s3 - s1) * w, 1.])
+        z = layers[0].z[1:]
+        scale = max(abs(G).max(), abs(s3 * C).max())
+        if (abs(D).max() > 1e-9 * scale or
+            not np.allclose(layers[1].z, layers[0].z) or not np.allclose(layers[2].z, layers[0].z)):
+            logger.warning('{}: the AC stamps are not of the form G + s C, using the direct sweep.'.format(self.name))
+            return False
+
+        znorm = np.linalg.norm(z)
+        if znorm == 0.:
+            # no AC sources
+            return True
+
+        # the residual is followed at a subset of the sweep, and checked over
+        # the whole of it once the model is good enough there
+        s = 1j * 2 * np.pi * self.freqs
+        check = np.unique(np.linspace(0, len(s)-1, self.options['mor_check_points']).astype(int))
+        k = check[len(check) // 2]
+        V = np.zeros((len(z), 0), dtype=complex)
+        while True:
+            q = V.shape[1]
+            V = self.add_krylov_vectors(G, C, z, self.freqs[k], V, is_sparse)
+            self.expansion_points.append(self.freqs[k])
+            if V.shape[1] == q:
+                logger.warning('{}: no new directions at {} Hz for the reduced order model, using the direct sweep.'.format(self.name, self.freqs[k]))
+                return False
+
+            try:
+                GV, CV = G @ V, C @ V
+                y, res = self.solve_reduced(GV, CV, z, s[check])
+                k = check[np.argmax(res)]
+                err = np.max(res) / znorm
+                if err <= self.options['mor_reltol']:
+                    y, res = self.solve_reduced(GV, CV, z, s)
+                    k = np.argmax(res)
+                    err = res[k] / znorm
+                    if err <= self.options['mor_reltol']:
+                        break
+                    check = np.union1d(check, [k])
+            except np.linalg.LinAlgError:
+                logger.warning('{}: singular reduced order model, using the direct sweep.'.format(self.name))
+                return False
+            if len(self.expansion_points) >= self.options['mor_max_points']:
+                logger.warning('{}: the reduced order model only reached a relative residual of {:.3g}, using the direct sweep.'.format(self.name, err))
+                return False
+
+        logger.info('{}: reduced order model of order {} from {} expansion points.'.format(
+            self.name, V.shape[1], len(self.expansion_points)))
+        self.xac = y @ V.T
+        return True
+
+    def add_krylov_vectors(self, G, C, z, f0, V, is_sparse):
+        # orthonormal vectors of K^-1 z, K^-1 C K^-1 z, ... with K = G + s0 C
+        # that are appended to the basis V
+        K = G + (1j * 2 * np.pi * f0) * C
+        solver = LinearSolver(self.name, len(z), is_sparse)
+        v, issolved = solver.solve(K, z)
+        for i in range(self.options['mor_order']):
+            if not issolved or V.shape[1] == len(z):
+                break
+
+            # Gram-Schmidt, twice to keep the basis orthogonal
+            vnorm = np.linalg.norm(v)
+            for j in range(2):
+                v = v - V @ (V.conj().T @ v)
+            if np.linalg.norm(v) <= 1e-10 * vnorm:
+                # the space is invariant, no new directions
+                break
+            v = v / np.linalg.norm(v)
+            V = np.hstack((V, v))
+
+            v, issolved = solver.solve(K, C @ v)
+        return V
+
+    def solve_reduced(self, GV, CV, z, s):
+        # y minimizing |z - (G + s C) V y| for all s, and the norm of the
+        # residual. With [GV, CV] = Q [R1, R2] the problem is reduced to
+        # (R1 + s R2) y = Q^H z, which is solved in batches by QR.
+        q = GV.shape[1]
+        Q, R = np.linalg.qr(np.hstack((GV, CV)))
+        c = Q.conj().T @ z
+        r0 = np.linalg.norm(z - Q @ c)
+
+        batch = max(1, self.options['batch_size'] // (2 * q**2))
+        y = np.empty((len(s), q), dtype=complex)
+        res = np.empty(len(s))
+        for k0 in range(0, len(s), batch):
+            sk = s[k0:k0+batch]
+            M = R[:,:q] + sk[:,None,None] * R[:,q:]
+            Qk, Rk = np.linalg.qr(M)
+            ck = np.conj(np.swapaxes(Qk, 1, 2)) @ c
+            y[k0:k0+batch] = np.linalg.solve(Rk, ck)[:,:,0]
+            rk = c - M @ y[k0:k0+batch,:,None]
+            res[k0:k0+batch] = np.sqrt(r0**2 + np.sum(np.abs(rk[:,:,0])**2, axis=1))
+        return y, res
 
     def create_freqs_array(self):
         if self.sweeptype == 'linear':
@@ -127,8 +352,67 @@ class AC():
                 self.freqs = np.linspace(self.start, self.stop, self.numpts)
         elif self.sweeptype == 'logarithm':
             self.freqs = np.geomspace(self.start, self.stop, self.numpts)
+        elif self.sweeptype == 'adaptive':
+            # coarse grid, refined by refine_freqs()
+            if self.start > 0:
+                self.freqs = np.geomspace(self.start, self.stop, self.numpts)
+            else:
+                self.freqs = np.linspace(self.start, self.stop, self.numpts)
         else:
             logger.warning('Failed to calculate the frequencies vector!')
             self.freqs = np.array([self.start, self.stop])
 
+    def refine_freqs(self, freqs, xac):
+        # New frequencies for the adaptive sweep. An interval is refined when
+        # |x| changes by more than 'adaptive_magtol' (relative to the peak of
+        # each variable over the sweep) or, where |x| is significant, the
+        # phase changes by more than 'adaptive_phasetol'. A rational function
+        # fitted to the neighbours of each interval places the new point on
+        # its pole when the pole lies inside the interval, which also finds
+        # resonances that are narrower than the interval itself.
+        magtol = self.options['adaptive_magtol']
+        phasetol = np.radians(self.options['adaptive_phasetol'])
+
+        scale = np.max(np.abs(xac), axis=0)
+        scale[scale == 0.] = 1.
+        x = xac / scale
+        mag = np.abs(x)
+        dmag = np.max(np.abs(np.diff(mag, axis=0)), axis=1, initial=0.)
+        dphase = np.abs(np.angle(x[1:] * np.conj(x[:-1])))
+        dphase[np.minimum(mag[1:], mag[:-1]) <= magtol] = 0.
+        refine = (dmag > magtol) | (np.max(dphase, axis=1, initial=0.) > phasetol)
+
+        # all the variables share the poles, the fits use a combination of
+        # them with different phases so that they do not cancel out
+        h = x @ np.exp(1j * np.arange(x.shape[1]))
+
+        new = []
+        for i in range(len(freqs)-1):
+            f1, f2 = freqs[i], freqs[i+1]
+            if f2 - f1 <= 1e-9 * f2:
+                continue
+            k = slice(max(0, i-1), min(len(freqs), i+3))
+            fp, width = self.get_resonance(freqs[k], h[k], f2)
+            margin = 0.01 * (f2 - f1)
+            if fp is not None and f1 + margin < fp < f2 - margin and (refine[i] or width < f2 - f1):
+                new.append(fp)
+            elif refine[i]:
+                new.append(np.sqrt(f1 * f2) if f1 > 0 else (f1 + f2) / 2.)
+        return np.array(new)
+
+    def get_resonance(self, freqs, h, fc):
+        # Pole of the rational function (a0 + a1 u) / (1 + b u), u = f / fc,
+        # fitted to the points (freqs, h), as the frequency of the peak and
+        # its half width. The pole u = -1 / b is complex, so the function
+        # peaks at Re(u) with the half width |Im(u)|.
+        if len(freqs) < 3:
+            return None, None
+        u = freqs / fc
+        A = np.column_stack((np.ones(len(u)), u, -h * u))
+        coeffs = np.linalg.lstsq(A, h, rcond=None)[0]
+        if coeffs[2] == 0.:
+            return None, None
+        up = -1. / coeffs[2]
+        return fc * up.real, fc * abs(up.imag)
+
 
@@ -0,0 +1,212 @@
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+
+from PyHBSim.Utils import hb_logger as logger
+
+import logging
+logger.setLevel(logging.INFO)
+
+options = dict()
+options['initial_step'] = 0.1       # initial (scaled) arclength step
+options['min_step'] = 1e-4          # give up when the step gets below this
+options['max_step'] = 1.
+options['max_steps'] = 200          # maximum number of continuation steps
+options['corrector_maxiter'] = 8    # maximum number of Newton iterations of the corrector
+options['max_contraction'] = 0.5    # reject the step when Newton contracts slower than this
+options['target_contraction'] = 0.25  # contraction rate the step size is adapted to
+options['step_growth'] = 2.         # maximum factor used to grow/shrink the step
+
+class Continuation():
+    """
+    Pseudo-arclength continuation of F(x, alpha) = 0 from alpha = 0 to 1.
+
+    'residual(x, alpha, xprev)' returns the tuple (F, dFdalpha, converged,
+    jac), where 'converged' applies the convergence test of the analysis to
+    F and 'jac()' returns dF/dx (dense or sparse), or a function that solves
+    dF/dx z = r, at the same point. 'xprev'
+    is the previous Newton iterate (the last solution on the curve for the
+    first iteration of a step), to be used for device voltage limiting.
+
+    Each step predicts along the tangent of the solution curve and corrects
+    with Newton on F extended by the arclength condition, so the curve can
+    be followed around turning points in alpha. The step is adapted to the
+    contraction rate of the corrector, and a step that contracts badly is
+    abandoned after a couple of iterations instead of a full Newton run.
+    """
+
+    def __init__(self, name, residual):
+        self.name = name
+        self.residual = residual
+
+        # output data
+        self.nr_iterations = 0
+        self.num_steps = 0
+        self.alphas = []
+
+        self.options = options.copy()
+
+    def run(self, x0, alpha0=0., alpha1=1.):
+        self.nr_iterations = 0
+        self.num_steps = 0
+        self.alphas = []
+        self.w = 1.
+
+        # start from a solution at alpha0
+        x, alpha, r, converged, _ = self.correct(x0, alpha0, x0, None, alpha0)
+        if not converged:
+            logger.warning('{}: no solution at alpha = {}.'.format(self.name, alpha0))
+            return x0, False
+        self.alphas.append(alpha)
+
+        # the arclength weights x against alpha so that both move by a
+        # similar amount on the first step
+        z, za = self.tangent(r)
+        self.w = max(1., np.linalg.norm(z / za))
+        t = self.normalize(z, za)
+
+        h = self.options['initial_step']
+        while self.num_steps < self.options['max_steps']:
+            self.num_steps += 1
+
+            tx, ta = t
+            if ta > 0 and alpha + h * ta >= alpha1:
+                # last step, the corrector lands exactly on alpha1
+                xp = x + (alpha1 - alpha) / ta * tx
+                ap = alpha1
+                c = None
+            else:
+                xp = x + h * tx
+                ap = alpha + h * ta
+                c = t
+
+            print('Alpha level: {:.4f}'.format(ap))
+
+            xnew, anew, rnew, converged, theta = self.correct(xp, ap, x, c, alpha1, contraction=True)
+
+            if not converged:
+                h = h / self.options['step_growth']
+                if h < self.options['min_step']:
+                    logger.warning('{}: continuation stopped at alpha = {}.'.format(self.name, alpha))
+                    return x, False
+                continue
+
+            x, alpha, r = xnew, anew, rnew
+            self.alphas.append(alpha)
+            if c is None:
+                print('Number of continuation steps: {}'.format(self.num_steps))
+                print('Continuation NR iterations: {}'.format(self.nr_iterations))
+                return x, True
+
+            # new tangent, oriented along the previous one
+            tnew = self.normalize(*self.tangent(r))
+            if self.dot(tnew, t) < 0:
+                tnew = (-tnew[0], -tnew[1])
+            t = tnew
+
+            # adapt the step to the observed contraction of Newton
+            growth = self.options['step_growth']
+            if theta > 0:
+                factor = np.sqrt(self.options['target_contraction'] / theta)
+                factor = min(growth, max(1. / growth, factor))
+            else:
+                factor = growth
+            h = min(self.options['max_step'], h * factor)
+
+        logger.warning('{}: maximum number of continuation steps reached.'.format(self.name))
+        return x, False
+
+    def correct(self, x, alpha, xprev, t, alpha1, contraction=False):
+        # Newton on [F(x, alpha); c(x, alpha)] = 0, where c is the arclength
+        # condition around the predicted point (x, alpha) when a tangent 't'
+        # is given, or alpha = alpha1 otherwise
+        xp, ap = x.copy(), alpha
+        theta = 0.
+        self.lu = None
+        dnormprev = None
+        for i in range(self.options['corrector_maxiter'] + 1):
+            r = self.residual(x, alpha, xprev)
+            F, dFda, converged, jac = r
+            # the first evaluation can be distorted by the voltage limiting
+            # of the devices, so at least one iteration is always done
+            if converged and i > 0:
+                return x, alpha, r, True, theta
+            if i == self.options['corrector_maxiter']:
+                break
+
+            if t is None:
+                cx, ca = np.zeros(x.shape), 1.
+                g = alpha - alpha1
+            else:
+                cx, ca = t[0] / self.w**2, t[1]
+                g = np.sum(cx * (x - xp)) + ca * (alpha - ap)
+
+            try:
+                d = self.solve_bordered(jac(), dFda, cx, ca, F, g)
+            except (RuntimeError, np.linalg.LinAlgError):
+                # singular jacobian
+                break
+            if np.any(np.isnan(d)):
+                break
+            self.nr_iterations += 1
+
+            dx, da = d[:-1], d[-1,0]
+            xprev = x
+            x = x - dx
+            alpha = alpha - da
+
+            dnorm = self.norm(dx, da)
+            if dnormprev is not None and dnormprev > 0:
+                theta = max(theta, dnorm / dnormprev)
+                if contraction and theta > self.options['max_contraction']:
+                    break
+            dnormprev = dnorm
+
+        return x, alpha, r, False, theta
+
+    def tangent(self, r):
+        # (dx, dalpha) along the solution curve, J dx + dF/dalpha dalpha = 0.
+        # The bordered matrix of the last corrector iteration is reused (its
+        # last row only fixes the length of the vector), otherwise it is
+        # factored at the solution with the row [0, 1].
+        F, dFda, converged, jac = r
+        rhs = np.zeros((F.shape[0]+1, 1))
+        rhs[-1] = 1.
+        if self.lu is None:
+            self.solve_bordered(jac(), dFda, np.zeros(dFda.shape), 1., F, 0.)
+        z = self.lu(rhs)
+        return z[:-1], z[-1,0]
+
+    def solve_bordered(self, J, b, c, d, F, g):
+        # solves [[J, b], [c^T, d]] [dx; da] = [F; g], the factors are kept
+        # in 'lu' for further solves
+        if callable(J):
+            # only a solver of J is available, the border is eliminated
+            # with one extra solve
+            z = J(b)
+            e = d - np.sum(c * z)
+            def solve(rhs):
+                x = J(rhs[:-1])
+                a = (rhs[-1,0] - np.sum(c * x)) / e
+                return np.vstack((x - a * z, [[a]]))
+            self.lu = solve
+        elif scipy.sparse.issparse(J):
+            A = scipy.sparse.bmat([[J, scipy.sparse.csc_matrix(b)],
+                                   [scipy.sparse.csr_matrix(c.T), scipy.sparse.csc_matrix([[d]])]], format='csc')
+            self.lu = scipy.sparse.linalg.splu(A).solve
+        else:
+            A = np.block([[J, b], [c.T, np.array([[d]])]])
+            lu = scipy.linalg.lu_factor(A)
+            self.lu = lambda rhs: scipy.linalg.lu_solve(lu, rhs)
+        return self.lu(np.vstack((F, [[g]])))
+
+    def norm(self, x, alpha):
+        return np.sqrt(np.sum(x**2) / self.w**2 + alpha**2)
+
+    def dot(self, t1, t2):
+        return np.sum(t1[0] * t2[0]) / self.w**2 + t1[1] * t2[1]
+
+    def normalize(self, z, a):
+        n = self.norm(z, a)
+        return (z / n, a / n)
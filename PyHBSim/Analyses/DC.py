@@ -1,14 +1,15 @@
 import numpy as np
 
 from PyHBSim.Devices import *
-from PyHBSim.Analyses.Solver import solve_linear#, solve_nonlinear
+from PyHBSim.Analyses.Solver import LinearSolver#, solve_nonlinear
+from PyHBSim.Analyses.StampPlan import StampPlan
 from PyHBSim.Utils import dc_logger as logger
 
 import logging
 logger.setLevel(logging.INFO)
 
 options = dict()
-options['is_sparse'] = False
+options['is_sparse'] = 'auto'   # True, False or 'auto' (by the size of the circuit)
 options['max_iterations'] = 150
 options['gmin'] = 1e-12
 
@@ -45,6 +46,8 @@ class DC():
         self.devs = []        # list of devices
         self.lin_devs = []    # list of linear devices
         self.nonlin_devs = [] # list of nonlinear devices
+        self.plan = None      # compiled stamp pattern of the MNA matrix
+        self.solver = None    # LU solver bound to the pattern of the plan
         
         self.options = options.copy() # DC simulation options
 
@@ -63,9 +66,14 @@ class DC():
         # Here we go!
         logger.info('Starting DC analysis.')
 
-        # create MNA matrices for linear devices
-        A = np.zeros((self.n+self.m, self.n+self.m))
-        z = np.zeros((self.n+self.m, 1))
+        # create MNA matrices for linear devices, the devices with constant
+        # stamps go to the G matrix of the plan and the nonlinear devices
+        # stamp into a layer of their own
+        self.solver = LinearSolver(self.name, self.n+self.m-1, self.options['is_sparse'])
+        self.plan = StampPlan(self.name, self.n+self.m, is_sparse=self.solver.is_sparse)
+        A = self.plan.new_layer()
+        z = A.z
+        self.Anl = self.plan.new_layer()
 
         # create initial condition array if none is provided
         if x0 is None: 
@@ -76,9 +84,9 @@ class DC():
             dev.init()
 
         # populate the matrices A and z with the linear devices stamps
-        for dev in self.lin_devs:
+        for dev in self.plan.add_devices(self.lin_devs, self.iidx):
             idx = self.get_extra_row_idx(dev)
-            dev.add_dc_stamps(A, z, None, idx)
+            dev.add_dc_stamps(A.A, z, None, idx)
 
         # TODO: add gmin only at problematic nodes such as middle of two
         #       capacitors or in parallel to pn junctions (high conductance)
@@ -89,7 +97,8 @@ class DC():
         # if there is not a nonlinear device, simply solve the linear system
         if not self.nonlin_devs:
             logger.info('Starting linear DC solver ...')
-            self.x, issolved = solve_linear(A[1:,1:], z[1:])
+            An = self.plan.get_matrix([self.plan.G, A])
+            self.x, issolved = self.solver.solve(An, z[1:])
             if issolved:
                 logger.info('Finished DC analysis.')
                 return self.x
@@ -130,27 +139,26 @@ class DC():
         maxiter = self.options['max_iterations']
 
         xk = x0.copy()
-        Anl = np.zeros(A.shape)
-        znl = np.zeros(z.shape)
+        Anl = self.Anl
+        znl = Anl.z
         converged = False
         k = 0
         while (not converged) and (k < maxiter):
             # refresh matrices
-            Anl[:,:] = 0.0
-            znl[:] = 0.0
+            Anl.clear()
 
             # add nonlinear element stamps
             for dev in self.nonlin_devs:
                 idx = self.get_extra_row_idx(dev)
-                dev.add_dc_stamps(Anl, znl, xk, idx)
+                dev.add_dc_stamps(Anl.A, znl, xk, idx)
 
             # index slicing is used to remove the 'gnd' node
             # An is the Jacobian matrix of the Newton-Raphson iteration
-            An = A[1:,1:] + Anl[1:,1:]
+            An = self.plan.get_matrix([self.plan.G, A, Anl])
             zn = z[1:] + znl[1:]
 
             # solve linear system
-            self.x, issolved = solve_linear(An, zn, self.options['is_sparse'])
+            self.x, issolved = self.solver.solve(An, zn)
 
             if not issolved:
                 logger.debug('Failed to resolve linear system! Solution has NaN ...')
@@ -0,0 +1,187 @@
+import numpy as np
+
+# The harmonic balance spectra are packed as real arrays in which the last
+# axis holds [X0, a1, b1, a2, b2, ..., aK, bK], so that each waveform is
+#
+#   x(s) = X0 + sum_k ak * cos(2 pi k s / S) + bk * sin(2 pi k s / S)
+#
+# with S = 2K + 1 time samples. These helpers map that packing onto numpy's
+# real FFT so that every node (or any other leading axis) is transformed in
+# a single call.
+
+def spectrum_to_time(X):
+    S = X.shape[-1]
+    K = (S - 1) // 2
+
+    C = np.empty(X.shape[:-1] + (K+1,), dtype=complex)
+    C[...,0] = S * X[...,0]
+    C[...,1:] = (S / 2.) * (X[...,1::2] - 1j * X[...,2::2])
+
+    return np.fft.irfft(C, n=S, axis=-1)
+
+def time_to_spectrum(x):
+    S = x.shape[-1]
+
+    C = np.fft.rfft(x, axis=-1)
+    X = np.empty(x.shape)
+    X[...,0] = C[...,0].real / S
+    X[...,1::2] = (2. / S) * C[...,1:].real
+    X[...,2::2] = - (2. / S) * C[...,1:].imag
+
+    return X
+
+def conversion_matrix(g):
+    # Builds the S x S matrix that maps the packed spectrum of v(t) onto the
+    # packed spectrum of g(t) * v(t), i.e. time_to_spectrum(g * spectrum_to_time(V)),
+    # directly from the Fourier coefficients of g(t). The harmonic products
+    # cos * cos and sin * sin give the Toeplitz (k - l) and Hankel (k + l)
+    # parts of the matrix, so it is filled in O(S^2) after a single FFT.
+    # 'g' may hold a stack of waveforms in its leading axes.
+    S = g.shape[-1]
+    K = (S - 1) // 2
+
+    G = np.fft.fft(g, axis=-1) / S
+    k = np.arange(1, K+1)
+    Gd = G[...,(k[:,None] - k[None,:]) % S]
+    Gs = G[...,(k[:,None] + k[None,:]) % S]
+
+    T = np.empty(g.shape[:-1] + (S, S))
+    T[...,0,0] = G[...,0].real
+    T[...,1::2,0] = 2. * G[...,1:K+1].real
+    T[...,2::2,0] = - 2. * G[...,1:K+1].imag
+    T[...,0,1::2] = G[...,1:K+1].real
+    T[...,0,2::2] = - G[...,1:K+1].imag
+    T[...,1::2,1::2] = (Gd + Gs).real
+    T[...,2::2,1::2] = - (Gd + Gs).imag
+    T[...,1::2,2::2] = (Gd - Gs).imag
+    T[...,2::2,2::2] = (Gd - Gs).real
+
+    return T
+
+class MultiToneGrid():
+    """
+    N-tone version of the transforms above. The spectrum holds the mixing
+    products of the tones listed in 'harmonics' (K+1 x T integer vectors,
+    DC first and every other vector with its first nonzero entry positive),
+    packed as [X0, a1, b1, ..., aK, bK]. Waveforms are sampled on a grid
+    with dims[i] points per period of tone i (at least 2 K_i + 1), flattened
+    into the last axis, and transformed with numpy's multi-dimensional real
+    FFT.
+    """
+
+    def __init__(self, harmonics, dims):
+        self.harmonics = np.asarray(harmonics, dtype=int)
+        self.dims = tuple(int(d) for d in dims)
+        self.size = int(np.prod(self.dims))
+        self.K = len(self.harmonics) - 1
+        self.axes = tuple(range(-len(self.dims), 0))
+
+        # rfftn only stores the last axis up to dims[-1] // 2, so vectors
+        # with a negative last entry are stored through -h (conjugated)
+        h = self.harmonics[1:]
+        self.flip = h[:,-1] < 0
+        self.index = self.get_index(np.where(self.flip[:,None], -h, h))
+
+        # vectors with a zero last entry need -h to be written as well
+        self.zero = np.nonzero(h[:,-1] == 0)[0]
+        self.index_zero = self.get_index(-h[self.zero])
+
+        # differences and sums of the mixing vectors (conversion matrices)
+        self.diff = h[:,None,:] - h[None,:,:]
+        self.sum = h[:,None,:] + h[None,:,:]
+
+    def get_index(self, v):
+        v = v % np.array(self.dims)
+        return tuple(v[...,i] for i in range(len(self.dims)))
+
+    def gather(self, C, v):
+        # C[v] for any vectors v, using C[-v] = conj(C[v]) outside of the
+        # half spectrum stored by rfftn
+        neg = (v[...,-1] % self.dims[-1]) > self.dims[-1] // 2
+        c = C[(Ellipsis,) + self.get_index(np.where(neg[...,None], -v, v))]
+        return np.where(neg, np.conj(c), c)
+
+    def spectrum_to_time(self, X):
+        lead = X.shape[:-1]
+        C = np.zeros(lead + self.dims[:-1] + (self.dims[-1] // 2 + 1,), dtype=complex)
+
+        c = (self.size / 2.) * (X[...,1::2] - 1j * X[...,2::2])
+        C[(Ellipsis,) + self.index] = np.where(self.flip, np.conj(c), c)
+        C[(Ellipsis,) + self.index_zero] = np.conj(c[...,self.zero])
+        C[(Ellipsis,) + (0,) * len(self.dims)] = self.size * X[...,0]
+
+        x = np.fft.irfftn(C, s=self.dims, axes=self.axes)
+        return x.reshape(lead + (self.size,))
+
+    def time_to_spectrum(self, x):
+        lead = x.shape[:-1]
+        C = np.fft.rfftn(x.reshape(lead + self.dims), axes=self.axes)
+
+        c = C[(Ellipsis,) + self.index]
+        c = np.where(self.flip, np.conj(c), c)
+        X = np.empty(lead + (2 * self.K + 1,))
+        X[...,0] = C[(Ellipsis,) + (0,) * len(self.dims)].real / self.size
+        X[...,1::2] = (2. / self.size) * c.real
+        X[...,2::2] = - (2. / self.size) * c.imag
+
+        return X
+
+    def conversion_matrix(self, g):
+        # same as conversion_matrix(), the Toeplitz and Hankel parts are
+        # indexed by the differences and sums of the mixing vectors
+        lead = g.shape[:-1]
+        K = self.K
+        S = 2 * K + 1
+
+        G = np.fft.rfftn(g.reshape(lead + self.dims), axes=self.axes) / self.size
+        G0 = G[(Ellipsis,) + (0,) * len(self.dims)]
+        G1 = self.gather(G, self.harmonics[1:])
+        Gd = self.gather(G, self.diff)
+        Gs = self.gather(G, self.sum)
+
+        T = np.empty(lead + (S, S))
+        T[...,0,0] = G0.real
+        T[...,1::2,0] = 2. * G1.real
+        T[...,2::2,0] = - 2. * G1.imag
+        T[...,0,1::2] = G1.real
+        T[...,0,2::2] = - G1.imag
+        T[...,1::2,1::2] = (Gd + Gs).real
+        T[...,2::2,1::2] = - (Gd + Gs).imag
+        T[...,1::2,2::2] = (Gd - Gs).imag
+        T[...,2::2,2::2] = (Gd - Gs).real
+
+        return T
+
+class AFMGrid(MultiToneGrid):
+    """
+    Artificial frequency mapping: each mixing vector h is mapped onto the
+    harmonic h @ coeffs of a single artificial tone, so the waveforms are
+    sampled with a 1-D FFT. The map is additive, which is all a memoryless
+    nonlinearity sees, and the coefficients are the smallest ones (from the
+    last tone to the first) that keep it one to one over +-harmonics.
+    'oversample' multiplies the number of time samples.
+    """
+
+    def __init__(self, harmonics, oversample=1):
+        harmonics = np.asarray(harmonics, dtype=int)
+        self.coeffs = self.calc_coeffs(harmonics)
+        lam = harmonics @ self.coeffs
+        super().__init__(lam[:,None], (oversample * (2 * np.max(lam) + 1),))
+
+    def calc_coeffs(self, harmonics):
+        H = np.vstack((harmonics, -harmonics[1:]))
+        T = H.shape[1]
+        coeffs = np.ones(T, dtype=int)
+        for i in range(T-2, -1, -1):
+            # trailing parts of the vectors, the first nonzero entry gives
+            # the sign their harmonic must have
+            Hi = np.unique(H[:,i:], axis=0)
+            first = Hi[np.arange(len(Hi)), np.argmax(Hi != 0, axis=1)]
+            c = 1
+            while True:
+                coeffs[i] = c
+                lam = Hi @ coeffs[i:]
+                if len(np.unique(lam)) == len(Hi) and np.all(np.sign(lam) == np.sign(first)):
+                    break
+                c += 1
+        return coeffs
@@ -0,0 +1,1309 @@
+import sys
+import itertools
+import collections
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.linalg
+
+from PyHBSim.Netlist import Netlist
+from PyHBSim.Analyses import AC, DC, Transient
+from PyHBSim.Analyses.Continuation import Continuation
+from PyHBSim.Analyses.Fourier import MultiToneGrid, AFMGrid
+from PyHBSim.Devices import *
+from PyHBSim.Utils import hb_logger as logger
+
+import logging
+logger.setLevel(logging.INFO)
+
+import matplotlib.pyplot as plt
+
+options = dict()
+options['reltol'] = 1e-3
+options['abstol'] = 1e-6
+options['maxiter'] = 100
+options['miniter'] = 3
+options['is_sparse'] = True
+options['solver'] = 'lu'            # 'lu' or 'gmres' (matrix-free Newton-Krylov)
+options['krylov_tol'] = 1e-6        # GMRES tolerance relative to |F|
+options['krylov_restart'] = 50
+options['krylov_maxiter'] = 20      # maximum number of GMRES restarts
+options['reuse_jacobian'] = False   # chord / Shamanskii Newton with the 'lu' solver
+options['max_jacobian_reuse'] = 5   # maximum number of iterations with the same LU
+options['jacobian_reuse_rate'] = 0.5  # refactor when |F| drops by less than this factor
+options['complex_solver'] = True    # solve analytic jacobians (and the GMRES preconditioner) with complex phasors
+options['analytic_tol'] = 1e-12     # relative ripple of g(t) and c(t) below which the jacobian is analytic
+options['adaptive_harmonics'] = False  # raise the number of harmonics until the spectra decay
+options['min_harmonics'] = 4        # initial number of harmonics (per tone) of the adaptive mode
+options['max_harmonics'] = 64       # upper limit of the number of harmonics (per tone)
+options['harmonic_growth'] = 2.     # factor used to raise the number of harmonics
+options['harmonic_tail'] = 0.25     # fraction of the harmonics (per tone) taken as the spectral tail
+options['harmonic_tol'] = 1e-6      # maximum energy in the tail relative to the AC energy of a node
+options['truncation'] = 'box'       # 'box' (|k_i| <= K_i) or 'diamond' (also sum |k_i| <= max K_i)
+options['frequency_map'] = 'grid'   # 'grid' (multi-dimensional FFT) or 'afm' (artificial frequency mapping onto a 1-D FFT)
+options['oversample'] = 1           # the devices are evaluated on oversample times more time samples (less aliasing)
+options['initial_guess'] = 'dc'     # 'dc' or 'transient' (transient-assisted HB, TAHB)
+options['tahb_periods'] = 2         # periods simulated by the transient, the last one is used
+options['tahb_points'] = 4          # time steps per period of the highest frequency of the grid
+options['tahb_max_points'] = 50000  # fall back to the DC guess when the transient needs more steps
+
+def get_device_key(dev):
+    # scalar attributes (nodes and values) of a device, used to detect when
+    # its admittance has to be evaluated again
+    return (type(dev).__name__,) + tuple((k, v) for k, v in sorted(vars(dev).items())
+                                         if isinstance(v, (bool, int, float, str)))
+
+class HarmonicBalanceCore:
+    """
+    Harmonic balance engine shared by HarmonicBalance (single tone) and
+    MultiToneHarmonicBalance (N tones). The unknowns are the spectra of the
+    node voltages and branch currents, packed as [X0, a1, b1, ..., aK, bK]
+    over the mixing products in 'harmonics'. The frequency map (see
+    Fourier.py) samples those spectra in time, and the nonlinear devices are
+    evaluated on all the samples at once through their add_hb_stamps().
+    """
+
+    def __init__(self, name, freq=1e9, numharmonics=10):
+        self.name = name
+        self.freq = freq
+        self.numharmonics = numharmonics
+
+        # cached admittances of the linear devices and the Y matrix built from them
+        self.admittance_cache = {}
+        self.Y_pattern = None
+        self.Y_cache = None
+        self.Yc_cache = None
+
+        self.options = options.copy()
+
+    def get_node_idx(self, node):
+        return self.netlist.get_node_idx(node) - 1
+
+    def get_branch_idx(self, name):
+        # row of the (first) branch current of device 'name'
+        for dev, i in self.iidx.items():
+            if dev.name == name:
+                return i - 1
+        logger.warning('{}: device {} has no branch current.'.format(self.name, name))
+        return None
+
+    def get_num_unknowns(self, netlist):
+        return netlist.get_num_nodes() - 1 + netlist.get_num_vsources()
+
+    def get_unknown_keys(self, netlist):
+        # names of the unknowns (nodes, then (device, branch) pairs), used to
+        # move solutions between netlists that share devices
+        keys = list(netlist.node_idx_to_name[1:])
+        for dev, i in sorted(netlist.get_mna_extra_rows_dict().items(), key=lambda x: x[1]):
+            keys += [(dev.name, j) for j in range(dev.get_num_vsources())]
+        return keys
+
+    def plot_v(self, node):
+        n = self.get_node_idx(node)
+
+        if self.freqs[1] > 1e9:
+            funit = 'GHz'
+            c = 1e9
+        elif self.freqs[1] > 1e6:
+            funit = 'MHz'
+            c = 1e6
+        elif self.freqs[1] > 1e3:
+            funit = 'kHz'
+            c = 1e3
+        else:
+            funit = 'Hz'
+            c = 1
+
+        plt.rc('axes', titlesize=14)    # fontsize of the axes title
+        plt.rc('axes', labelsize=12)    # fontsize of the x and y labels
+
+        if self.num_tones == 1:
+            plt.figure(figsize=(14,5))
+            plt.subplot(121)
+        else:
+            plt.figure(figsize=(10,6))
+
+        # plt.rc('font', size=SMALL_SIZE)          # controls default text sizes
+        # plt.rc('xtick', labelsize=SMALL_SIZE)    # fontsize of the tick labels
+        # plt.rc('ytick', labelsize=SMALL_SIZE)    # fontsize of the tick labels
+        # plt.rc('legend', fontsize=SMALL_SIZE)    # legend fontsize
+        # plt.rc('figure', titlesize=BIGGER_SIZE)  # fontsize of the figure title
+
+        plt.title('Frequency-domain $V(j \omega)$')
+        plt.stem(self.freqs / c, np.abs(self.Vf[n]), use_line_collection=True, markerfmt='r^', linefmt='r')
+        for f, v in zip(self.freqs, self.Vf[n]):
+            label = r'{:.3f} $\angle$ {:.1f}$^\circ$'.format(np.abs(v), np.degrees(np.angle(v)))
+            # if f <= 3 * self.freqs[1]:
+            plt.annotate(label, (f / c, np.abs(v)), textcoords="offset points", xytext=(0,5), ha='left', va='bottom', rotation=45)
+        plt.xlabel('frequency [' + funit + ']')
+        plt.ylabel('V(\'' + node + '\') [V]')
+        plt.grid()
+        plt.tight_layout()
+
+        # if single-tone analysis, also plot time-domain waveform
+        if self.num_tones == 1:
+            S = 32 * self.K # increase number of time samples
+            time = 2 / self.freq / S * np.linspace(0, S, S)
+            Vt = np.zeros(S)
+            for s in range(S):
+                Vt[s] = self.Vf[n,0].real
+                for k in range(1, self.K+1):
+                    Vt[s] = Vt[s] + self.Vf[n,k].real * np.cos(2. * np.pi * k * s / (S / 2)) - \
+                                    self.Vf[n,k].imag * np.sin(2. * np.pi * k * s / (S / 2))
+
+            if time[-1] > 1:
+                tunit = 's'
+                c = 1
+            elif time[-1] > 1e-3:
+                tunit = 'ms'
+                c = 1e3
+            elif time[-1] > 1e-6:
+                tunit = '$\mu$s'
+                c = 1e6
+            elif time[-1] > 1e-9:
+                tunit = 'ns'
+                c = 1e9
+            else: # time[-1] > 1e-12
+                tunit = 'ps'
+                c = 1e12
+
+            plt.subplot(122)
+            plt.title('Time-domain $V(t)$')
+            plt.plot(time * c, Vt)
+            plt.xlabel('time [' + tunit + ']')
+            plt.ylabel('V(\'' + node + '\') [V]')
+            plt.grid()
+            plt.tight_layout()
+
+    def print_v(self, node):
+        n = self.get_node_idx(node)
+        print('Voltage at node: ' + node)
+        print('Freq [Hz]\tVmag [V]\tPhase [°]')
+        for k in range(0, self.K+1):
+            v = self.Vf[n,k]
+            print('{:.2e}\t{:.3e}\t{:.1f}'.format(self.freqs[k], np.abs(v), np.degrees(np.angle(v))))
+
+    def get_v(self, node):
+        n = self.get_node_idx(node)
+        v = self.Vf[n]
+        return v
+
+    def get_i(self, name):
+        # spectrum of the branch current of device 'name' (flowing from its
+        # positive node through the device)
+        return self.Vf[self.get_branch_idx(name)]
+
+    def convert_to_time(self, xf):
+        S = 32 * self.K # increase number of time samples
+        t = 2 / self.freq / S * np.linspace(0, S, S)
+        xt = np.zeros(S)
+        for s in range(S):
+            xt[s] = xf[0].real
+            for k in range(1, self.K+1):
+                xt[s] = xt[s] + xf[k].real * np.cos(2. * np.pi * k * s / (S / 2)) - \
+                                xf[k].imag * np.sin(2. * np.pi * k * s / (S / 2))
+
+        return t, xt
+
+    def run_oscillator(self, netlist, f0, numharmonics, V0, node, useprev=False):
+        # Autonomous harmonic balance: the oscillation frequency is solved
+        # together with the node spectra by a single Newton loop. The initial
+        # guess comes from a forced HB run with an ideal probe imposing an
+        # amplitude V0 at f0 on 'node' (or from the last solution if useprev).
+
+        netlist = netlist.copy()
+
+        # config harmonic balance
+        self.freq = float(f0)
+        self.numharmonics = numharmonics
+
+        W = self.get_num_unknowns(netlist) * (2 * numharmonics + 1)
+        if useprev and getattr(self, 'V', None) is not None and self.V.shape == (W,1):
+            V = self.V.copy()
+        else:
+            V = self.calc_oscprobe_V0(netlist, f0, V0, node)
+            if V is None:
+                print('Oscillator probe analysis did not converge')
+                return False, None, None, None, None
+
+        Is, Y = self.setup(netlist)
+
+        V, converged = self.osc_loop(Is, Y, V, self.get_node_idx(node))
+
+        if not converged:
+            return False, None, None, None, None
+
+        self.set_solution(V)
+
+        print('Frequency of oscillation = {} Hz'.format(self.freq))
+        print('Oscillation amplitude = {} V'.format(np.abs(self.Vf[self.get_node_idx(node),1])))
+
+        return converged, self.freqs, self.Vf, None, None
+
+    def calc_oscprobe_V0(self, netlist, f0, V0, node):
+        # Forced solutions with the probe (a voltage source at f0 connected
+        # to 'node' through an ideal harmonic filter). The probe amplitude is
+        # scanned from V0 until the real part of the probe admittance changes
+        # sign, which brackets the oscillation amplitude.
+        probe = netlist.copy()
+        Voscprobe = probe.add_vac(self.name + '.V.Oscprobe', self.name + '.nosc2', 'gnd', ac=V0, freq=f0)
+        Zoscprobe = probe.add_idealharmonicfilter(self.name + 'IHF.Oscprobe', self.name + '.nosc2', node, f0)
+
+        def probe_admittance(A, V):
+            Voscprobe.ac = A
+            converged, freqs, Vf, _, _ = self.run(probe, V)
+            if not converged:
+                return None, None
+            n1 = self.get_node_idx(node)
+            n2 = self.get_node_idx(self.name + '.nosc2')
+            Yosc = (Vf[n1,1] - Vf[n2,1]) * Zoscprobe.g / Vf[n1,1]
+            return Yosc.real, self.V
+
+        A = V0
+        G, V = probe_admittance(A, None)
+        if G is None:
+            return None
+
+        step = 2. if G > 0 else 0.5
+        for i in range(10):
+            Anew = A * step
+            Gnew, Vnew = probe_admittance(Anew, V)
+            if Gnew is None:
+                break
+
+            if np.sign(Gnew) != np.sign(G):
+                # refine the bracket with a few regula falsi steps
+                for j in range(3):
+                    Am = A + (Anew - A) * G / (G - Gnew)
+                    Gm, Vm = probe_admittance(Am, V)
+                    if Gm is None:
+                        break
+                    V = Vm
+                    if np.sign(Gm) == np.sign(G):
+                        A, G = Am, Gm
+                    else:
+                        Anew, Gnew = Am, Gm
+                break
+
+            A, G, V = Anew, Gnew, Vnew
+
+        # drop the unknowns of the probe
+        keys = self.get_unknown_keys(probe)
+        idx = [keys.index(key) for key in self.get_unknown_keys(netlist)]
+        return V.reshape(len(keys), self.S)[idx].reshape(-1, 1)
+
+    def set_frequency(self, f):
+        # moves the single-tone frequency grid and returns the new Y
+        self.freq = float(f)
+        self.f1 = self.freq
+        self.tones = np.array([self.freq])
+        self.freqs = self.harmonics @ self.tones
+        self.negfreqs = self.freqs < 0
+        self.omega = 2 * np.pi * self.freqs[1:]
+        return self.calc_Y()
+
+    def calc_dFdf(self, Y, V, Qf, f):
+        # dF/df: Omega (in the charges) is proportional to f and the
+        # derivative of Y is taken with finite differences
+        h = 1e-6 * f
+        dYdf = (self.set_frequency(f + h) - Y) / h
+        return dYdf @ V + Qf / f
+
+    def osc_loop(self, Is, Y, V, n):
+        # Newton on the augmented system [F(V, f); b1(n)] = 0, where the
+        # phase condition b1(n) = 0 pins the fundamental of node 'n' to a
+        # cosine. The frequency unknown is normalized by the initial one.
+        S = self.S
+        ia = n * S + 1
+        ib = n * S + 2
+        f0 = self.freq
+        self.osc_idx = ib
+
+        # rotate the initial guess so that the phase condition holds
+        phi = np.arctan2(V[ib,0], V[ia,0])
+        X = V.reshape(self.N, S).copy()
+        Vk = (X[:,1::2] + 1j * X[:,2::2]) * np.exp(-1j * np.arange(1, self.K+1) * phi)
+        X[:,1::2] = Vk.real
+        X[:,2::2] = Vk.imag
+        V = X.reshape(self.W, 1)
+        V[ib] = 0.
+
+        # phase condition row
+        e = scipy.sparse.coo_matrix(([1.], ([0], [ib])), shape=(1, self.W))
+
+        def residual(V, f, vtprev):
+            Y = self.set_frequency(f)
+            vt = self.ifft(V).reshape(self.N, self.St)
+            it, qt, dIdV, dQdV = self.eval_nonlinear(vt, vtprev)
+            Qf = self.apply_omega(self.fft(qt).reshape(self.N, S, 1)).reshape(self.W,1)
+            Il = Y @ V - Is
+            Inl = self.fft(it) + Qf
+            # the residual is measured relative to the oscillation amplitude,
+            # otherwise the trivial solution V = 0 looks like a good descent
+            merit = np.linalg.norm(Il + Inl) / abs(V[ia,0])
+            return dict(Y=Y, vt=vt, Il=Il, Inl=Inl, Qf=Qf, dIdV=dIdV, dQdV=dQdV, merit=merit)
+
+        f = f0
+        vt = self.ifft(V).reshape(self.N, self.St)
+        r = residual(V, f, vt)
+
+        converged = False
+        maxiter = self.options['maxiter']
+        itercnt = 0
+        while True:
+
+            F = r['Il'] + r['Inl']
+            converged = self.hb_converged(r['Il'], r['Inl'])
+            itercnt += 1
+            self.nr_iterations = itercnt
+            print('{}\t{:.8f}\t{:.8f}\t{:.2e}'.format(itercnt, f, V[ia,0], np.linalg.norm(F)))
+            if (converged and itercnt >= self.options['miniter']) or itercnt >= maxiter:
+                print('NR number of iterations: {}'.format(itercnt))
+                self.set_frequency(f)
+                return V, converged
+
+            dFdf = f0 * self.calc_dFdf(r['Y'], V, r['Qf'], f)
+
+            J = self.calc_jacobian(r['Y'], r['dIdV'], r['dQdV'])
+            Ja = scipy.sparse.bmat([[J, scipy.sparse.csc_matrix(dFdf)], [e, None]], format='csc')
+            try:
+                dx = scipy.sparse.linalg.splu(Ja).solve(np.vstack((F, [[0.]])))
+            except RuntimeError:
+                # singular jacobian
+                return V, False
+            if np.any(np.isnan(dx)):
+                return V, False
+
+            dV = dx[:-1]
+            df = f0 * dx[-1,0]
+
+            # limit the changes of amplitude and frequency of a single step
+            lam = 1.
+            if abs(dV[ia,0]) > 0.5 * abs(V[ia,0]):
+                lam = 0.5 * abs(V[ia,0] / dV[ia,0])
+            if abs(df) > 0.3 * f:
+                lam = min(lam, 0.3 * f / abs(df))
+
+            # backtracking on the relative residual
+            for i in range(10):
+                rnew = residual(V - lam * dV, f - lam * df, r['vt'])
+                if rnew['merit'] < r['merit']:
+                    break
+                lam = lam / 2
+
+            V = V - lam * dV
+            f = f - lam * df
+            r = rnew
+
+    def setup(self, netlist):
+        # prepares the frequency grid and the linear part of the system,
+        # returns the source currents (Is) and the admittance matrix (Y)
+        self.netlist = netlist.copy()
+
+        # get device data from netlist
+        self.lin_devs = self.netlist.get_linear_devices()
+        self.nonlin_devs = self.netlist.get_nonlinear_devices()
+
+        # print option to make large matrices readable
+        np.set_printoptions(precision=4, threshold=sys.maxsize, linewidth=160)
+
+        """ Get setup variables and the mixing products of the tones """
+
+        tones = [self.freq] if np.isscalar(self.freq) else list(self.freq)
+        self.num_tones = len(tones)
+        self.tones = np.array(tones, dtype=float)
+        self.f1 = self.tones[0]
+        if self.num_tones > 1:
+            self.f2 = self.tones[1]
+
+        orders = np.atleast_1d(self.numharmonics)
+        if len(orders) == 1:
+            orders = np.repeat(orders, self.num_tones)
+        self.harmonics = self.calc_harmonics(orders)
+        self.K = len(self.harmonics) - 1
+        self.freqs = self.harmonics @ self.tones
+        self.negfreqs = self.freqs < 0
+
+        self.grid = self.calc_frequency_map(orders)
+
+        # unknowns are the node voltages followed by the branch currents of
+        # the devices with MNA extra rows (voltage sources, inductors, ...)
+        self.iidx = self.netlist.get_mna_extra_rows_dict()
+        self.S = 2 * self.K + 1
+        self.St = self.grid.size
+        self.N = self.get_num_unknowns(self.netlist)
+        self.W = self.S * self.N
+        self.omega = 2 * np.pi * self.freqs[1:]
+
+        # print('Freqs = {}'.format(self.freqs))
+
+        """ Independent current sources (Is) """
+
+        Is = self.calc_Is()
+
+        # print('Is = {}'.format(Is))
+
+        """ Transadmittance matrix Y(jw) """
+
+        Y = self.calc_Y()
+
+        # print('Y = {}'.format(Y))
+
+        # LU factors kept between Newton iterations (see 'reuse_jacobian')
+        self.lu_solve = None
+
+        # unknown pinned by the phase condition of an autonomous solution
+        self.osc_idx = None
+
+        return Is, Y
+
+    def calc_frequency_map(self, orders):
+        # The minimum sampling (2 K + 1 points per period) folds the
+        # harmonics above K of the device currents back onto the unknowns.
+        # Oversampling only makes the FFTs and device evaluations larger,
+        # the number of unknowns stays the same.
+        oversample = int(self.options['oversample'])
+        if self.options['frequency_map'] == 'afm':
+            # the mixing products are mapped onto harmonics of a single
+            # artificial tone and sampled with a 1-D FFT
+            return AFMGrid(self.harmonics, oversample)
+        # the waveforms are sampled on a grid with 2 * K_i + 1 points per
+        # period of every tone
+        return MultiToneGrid(self.harmonics, oversample * (2 * orders + 1))
+
+    def calc_harmonics(self, orders):
+        # mixing vectors (k_1, ..., k_T) of the spectrum, DC first and then
+        # the vectors whose first nonzero entry is positive (the others are
+        # the conjugate frequencies)
+        harmonics = [(0,) * len(orders)]
+        for h in itertools.product(*[range(-K, K+1) for K in orders]):
+            h = np.array(h)
+            nz = np.nonzero(h)[0]
+            if len(nz) == 0 or h[nz[0]] < 0:
+                continue
+            if self.options['truncation'] == 'diamond' and np.sum(np.abs(h)) > np.max(orders):
+                continue
+            harmonics.append(tuple(h))
+
+        return np.array(harmonics, dtype=int)
+
+    def run(self, netlist, V0=None):
+        if self.options['adaptive_harmonics']:
+            return self.run_adaptive(netlist, V0)
+        return self.run_fixed(netlist, V0)
+
+    def run_adaptive(self, netlist, V0=None):
+        # Starts with 'min_harmonics' and raises the number of harmonics until
+        # the energy in the top harmonics of every node is below 'harmonic_tol'
+        # (relative to its AC energy). Each solve is seeded with the previous
+        # solution padded with zeros.
+        single = np.isscalar(self.numharmonics)
+        kmin = self.options['min_harmonics']
+        kmax = self.options['max_harmonics']
+        growth = self.options['harmonic_growth']
+
+        self.numharmonics = kmin if single else [kmin] * len(self.numharmonics)
+
+        while True:
+            converged, freqs, Vf, _, _ = self.run_fixed(netlist, V0)
+            if not converged:
+                return False, None, None, None, None
+
+            tail = self.calc_spectral_tail()
+            print('Number of harmonics: {}, relative energy in the spectral tail: {:.3e}'.format(self.numharmonics, tail))
+
+            K = np.atleast_1d(self.numharmonics)
+            if tail <= self.options['harmonic_tol']:
+                break
+            if np.all(K >= kmax):
+                logger.warning('{}: spectral tail above tolerance with the maximum number of harmonics.'.format(self.name))
+                break
+
+            Knew = np.minimum(np.maximum(np.ceil(K * growth).astype(int), K + 1), kmax)
+            harmonics, V = self.harmonics.copy(), self.V
+            self.numharmonics = int(Knew[0]) if single else [int(k) for k in Knew]
+            V0 = self.pad_solution(netlist, harmonics, V)
+
+        return converged, self.freqs, self.Vf, None, None
+
+    def calc_spectral_tail(self):
+        # largest ratio (over the nodes) between the energy of the harmonics
+        # in the tail of the spectrum and the AC energy of the node
+        K = np.atleast_1d(self.numharmonics)
+        m = np.maximum(1, np.round(self.options['harmonic_tail'] * K)).astype(int)
+        intail = np.any(np.abs(self.harmonics) > K - m, axis=1)
+        if self.options['truncation'] == 'diamond':
+            intail |= np.sum(np.abs(self.harmonics), axis=1) > np.max(K - m)
+        intail[0] = False
+
+        E = np.abs(self.Vf[:,1:])**2
+        Eac = np.sum(E, axis=1)
+        Etail = np.sum(E[:,intail[1:]], axis=1)
+
+        # skip nodes without (significant) AC signals
+        active = Eac > max(self.options['abstol']**2, 1e-12 * np.max(Eac, initial=0.))
+        if not np.any(active):
+            return 0.
+        return np.max(Etail[active] / Eac[active])
+
+    def pad_solution(self, netlist, harmonics, V):
+        # maps a solution computed with the (smaller) set of 'harmonics' onto
+        # the frequency grid of the current number of harmonics
+        N = self.get_num_unknowns(netlist)
+        S = V.shape[0] // N
+        self.setup(netlist)
+        index = {tuple(h): i for i, h in enumerate(harmonics)}
+
+        Vold = V.reshape(N, S)
+        Vnew = np.zeros((self.N, self.S))
+        Vnew[:,0] = Vold[:,0]
+        for i, h in enumerate(self.harmonics[1:], 1):
+            j = index.get(tuple(h))
+            if j is not None:
+                Vnew[:,2*i-1:2*i+1] = Vold[:,2*j-1:2*j+1]
+
+        return Vnew.reshape(self.W, 1)
+
+    def run_fixed(self, netlist, V0=None):
+
+        Is, Y = self.setup(netlist)
+
+        """ Initial voltage estimation for each node V(jw) and v(t) """
+
+        if V0 is None and self.options['initial_guess'] == 'transient':
+            V0 = self.calc_tahb_V0()
+
+        if V0 is None:
+            V = self.calc_V0()
+        else:
+            V = V0
+
+        # print('V = {}'.format(V))
+
+        """ Run Harmonic Balance Solver """
+
+        if V0 is None:
+            converged = False
+        else:
+            V, converged = self.hb_loop(Is, Y, V)
+            if not converged:
+                V = self.calc_V0()
+
+        # if first attempt fails, try continuation method
+        if converged == False:
+            V, converged = self.continuation(Is, Y, V)
+
+        if not converged:
+            return False, None, None, None, None
+
+        self.set_solution(V)
+
+        return converged, self.freqs, self.Vf, None, None
+
+    def continuation(self, Is, Y, V):
+        # Source stepping: the harmonics of the sources are scaled by alpha,
+        # and the solution is traced from the DC one (alpha = 0) to alpha = 1
+        Isac = Is.reshape(self.N, self.S).copy()
+        Isac[:,0] = 0.
+        Isac = Isac.reshape(self.W, 1)
+        Isdc = Is - Isac
+
+        # the corrector solves with the same options as hb_loop: GMRES, or
+        # the LU factors of an older jacobian while |F| drops fast enough
+        self.krylov_iterations = []
+        self.num_factorizations = 0
+        self.lu_solve = None
+        reuse = {'Fnorm': np.inf, 'count': 0}
+
+        def residual(V, alpha, Vprev):
+            vt = self.ifft(V).reshape(self.N, self.St)
+            vtprev = self.ifft(Vprev).reshape(self.N, self.St)
+            it, qt, dIdV, dQdV = self.eval_nonlinear(vt, vtprev)
+
+            Il = Y @ V - Isdc - alpha * Isac
+            Qf = self.fft(qt).reshape(self.N, self.S, 1)
+            Inl = self.fft(it) + self.apply_omega(Qf).reshape(self.W,1)
+            F = Il + Inl
+
+            def jac():
+                if self.options['solver'] == 'gmres':
+                    return lambda r: self.solve_krylov(Y, dIdV, dQdV, r)
+                if self.options['reuse_jacobian']:
+                    Fnorm = np.linalg.norm(F)
+                    if (self.lu_solve is not None and reuse['count'] < self.options['max_jacobian_reuse'] and
+                        Fnorm < self.options['jacobian_reuse_rate'] * reuse['Fnorm']):
+                        reuse['count'] += 1
+                    else:
+                        self.lu_solve = self.factorize_jacobian(Y, dIdV, dQdV)
+                        self.num_factorizations += 1
+                        reuse['count'] = 0
+                    reuse['Fnorm'] = Fnorm
+                    if self.lu_solve is None:
+                        raise RuntimeError('singular jacobian')
+                    return self.lu_solve
+                if self.options['complex_solver'] and self.is_analytic(dIdV, dQdV):
+                    solve = self.factorize_complex_jacobian(dIdV, dQdV)
+                    if solve is None:
+                        raise RuntimeError('singular jacobian')
+                    return solve
+                return self.calc_jacobian(Y, dIdV, dQdV)
+            return F, -Isac, self.hb_converged(Il, Inl), jac
+
+        cont = Continuation(self.name + '.Continuation', residual)
+        V, converged = cont.run(V)
+        self.nr_iterations = cont.nr_iterations
+        if not converged:
+            self.lu_solve = None
+
+        print('Final convergence: {}'.format(converged))
+        if self.options['solver'] == 'gmres':
+            print('GMRES iterations: {}'.format(sum(self.krylov_iterations)))
+        elif self.options['reuse_jacobian']:
+            print('Number of LU factorizations: {}'.format(self.num_factorizations))
+
+        return V, converged
+
+    def set_solution(self, V):
+
+        # keep backup of solution (it can be used as I.C. for another run)
+        self.V = V
+
+        # Vf is an array with the voltage phasor at each node for all frequencies
+        self.Vf = np.zeros((self.N,self.K+1), dtype=complex)
+        for n in range(self.N):
+            self.Vf[n,0] = self.V[n*self.S,0]
+            for k in range(1, self.K+1):
+                i = n * self.S + 2 * (k - 1) + 1
+                An  = np.sqrt(self.V[i,0]**2 + self.V[i+1,0]**2)
+                phi = np.arctan2(self.V[i+1,0], self.V[i,0])
+                self.Vf[n,k] = An * np.exp(1j * phi)
+
+        # phasors of the mixing products at negative frequencies are reported
+        # at the positive one
+        self.Vf[:,self.negfreqs] = np.conj(self.Vf[:,self.negfreqs])
+        self.freqs = np.abs(self.freqs)
+
+    def hb_loop(self, Is, Y, V):
+
+        vt = self.ifft(V).reshape(self.N, self.St)
+
+        # number of GMRES iterations of each Newton step
+        self.krylov_iterations = []
+
+        # LU factorizations done in this loop, 'lu_solve' is kept from the
+        # previous call when the jacobian is reused
+        self.num_factorizations = 0
+        numreuse = 0
+        reused = False
+        Fnormprev = np.inf
+
+        converged = False
+        maxiter = self.options['maxiter']
+        itercnt = 0
+        dV = None
+        while True:
+
+            """ Time-domain v(t) """
+
+            vtprev = vt.copy()
+            vt = self.ifft(V).reshape(self.N, self.St)
+
+            # print('vt = {}'.format(vt))
+
+            """ Time-domain g(t) and i(t) waveforms """
+
+            it, qt, dIdV, dQdV = self.eval_nonlinear(vt, vtprev)
+
+            """ Linear current Il(jw) """
+
+            Il = Y @ V - Is
+
+            """ Nonlinear current Inl(jw) """
+
+            Qf = self.fft(qt).reshape(self.N, self.S, 1)
+            Inl = self.fft(it) + self.apply_omega(Qf).reshape(self.W,1)
+
+            """ Calculate error function F(jw) """
+
+            F = Il + Inl
+
+            # print('F = {}'.format(F))
+
+            """ Check algorithm termination conditions """
+
+            converged = self.hb_converged(Il, Inl)
+            itercnt += 1
+            # a diverged Newton (e.g. from a poor initial guess) is not recovered
+            diverged = not np.all(np.isfinite(F))
+            if (converged and itercnt >= self.options['miniter']) or itercnt >= maxiter or diverged:
+                print('HB total error: {:.2e}'.format(np.sum(np.abs(F))))
+                print('NR number of iterations: {}'.format(itercnt))
+                self.nr_iterations = itercnt
+                if self.options['solver'] != 'gmres':
+                    print('Number of LU factorizations: {}'.format(self.num_factorizations))
+                if not converged:
+                    self.lu_solve = None
+                return V, converged
+
+            """ Calculate next voltage guess using NR """
+
+            if self.options['solver'] == 'gmres':
+                dVnew = self.solve_krylov(Y, dIdV, dQdV, F)
+                print('GMRES iterations: {}'.format(self.krylov_iterations[-1]))
+            else:
+                # chord / Shamanskii Newton: keep the LU factors of an older
+                # jacobian while the residual still drops fast enough
+                Fnorm = np.linalg.norm(F)
+                if reused and Fnorm > Fnormprev:
+                    # the last step with the old factors made things worse,
+                    # so it is redone with the jacobian of the previous iteration
+                    V, vt, F, Fnorm, dIdV, dQdV = Vprev, vtprev, Fprev, Fnormprev, dIdVprev, dQdVprev
+                    reused = False
+                else:
+                    reused = (self.lu_solve is not None and self.options['reuse_jacobian'] and
+                              numreuse < self.options['max_jacobian_reuse'] and
+                              Fnorm < self.options['jacobian_reuse_rate'] * Fnormprev)
+
+                if reused:
+                    numreuse += 1
+                else:
+                    self.lu_solve = self.factorize_jacobian(Y, dIdV, dQdV)
+                    self.num_factorizations += 1
+                    numreuse = 0
+                Fprev, Fnormprev, dIdVprev, dQdVprev = F, Fnorm, dIdV, dQdV
+
+                if self.lu_solve is None:
+                    # singular jacobian
+                    dVnew = np.full(F.shape, np.nan)
+                else:
+                    dVnew = self.lu_solve(F)
+
+            # any element in dV is nan, do not update reuse last decrement
+            if np.any(np.isnan(dVnew)):
+                if dV is None:
+                    # no valid step yet (e.g. singular jacobian at the first iteration)
+                    logger.warning('{}: singular jacobian, no Newton step.'.format(self.name))
+                    self.nr_iterations = itercnt
+                    self.lu_solve = None
+                    return V, False
+            else:
+                dV = dVnew
+
+            Vprev = V
+            V = V - dV
+
+            # print('V = {}'.format(V))
+
+    def calc_residual(self, V):
+        # F(V) with the current device values, the device voltages are not
+        # limited (vtprev = vt)
+        Is = self.calc_Is()
+        Y = self.calc_Y()
+        vt = self.ifft(V).reshape(self.N, self.St)
+        it, qt, dIdV, dQdV = self.eval_nonlinear(vt, vt)
+        Qf = self.apply_omega(self.fft(qt).reshape(self.N, self.S, 1)).reshape(self.W,1)
+        F = Y @ V - Is + self.fft(it) + Qf
+        return F, Y, Qf, dIdV, dQdV
+
+    def set_param(self, device, param, value):
+        # device attribute (R, C, L, dc, ...) or model option (Is, Bf, ...)
+        if hasattr(device, param):
+            setattr(device, param, value)
+        else:
+            device.options[param] = value
+            device.init()
+
+    def get_param(self, device, param):
+        if hasattr(device, param):
+            return getattr(device, param)
+        return device.options[param]
+
+    def calc_sensitivity(self, params, outputs, rel_step=1e-6):
+        """
+        Adjoint sensitivities of the last solution. 'params' is a list of
+        (device, name) pairs, with name a device attribute (R, C, L, ...) or
+        a model option (Is, Bf, ...), and 'outputs' a list of (node, k)
+        phasors. Returns dVf (len(outputs) x len(params), complex) with
+        dVf[i,j] = d Vf[node_i,k_i] / d params[j], and dfreq with the
+        derivatives of the oscillation frequency (zero for forced runs).
+
+        The jacobian is factored once at the solution and every output
+        costs one transposed solve, whatever the number of parameters. The
+        derivatives of the residual with respect to the parameters are
+        taken with forward differences of relative step 'rel_step', which
+        only evaluates the devices (no HB solve).
+        """
+        V = self.V
+        F0, Y, Qf, dIdV, dQdV = self.calc_residual(V)
+
+        """ dF/dp """
+
+        P = len(params)
+        Fp = np.zeros((self.W, P))
+        for j, (device, param) in enumerate(params):
+            p = self.get_param(device, param)
+            dp = rel_step * abs(p) if p != 0 else rel_step
+            self.set_param(device, param, p + dp)
+            Fp[:,j] = (self.calc_residual(V)[0] - F0)[:,0] / dp
+            self.set_param(device, param, p)
+
+        # leaves the devices and the cached Y at the solution
+        F0, Y, Qf, dIdV, dQdV = self.calc_residual(V)
+
+        """ Jacobian (augmented with the frequency for oscillators) """
+
+        J = self.calc_jacobian(Y, dIdV, dQdV)
+        if self.osc_idx is not None:
+            f = self.freq
+            dFdf = f * self.calc_dFdf(Y, V, Qf, f)
+            self.set_frequency(f)
+            e = scipy.sparse.coo_matrix(([1.], ([0], [self.osc_idx])), shape=(1, self.W))
+            J = scipy.sparse.bmat([[J, scipy.sparse.csc_matrix(dFdf)], [e, None]], format='csc')
+            Fp = np.vstack((Fp, np.zeros((1, P))))
+
+        """ Adjoint solves, one per real output """
+
+        rows = []
+        for node, k in outputs:
+            n = self.get_node_idx(node)
+            if k == 0:
+                rows += [n * self.S, n * self.S]
+            else:
+                rows += [n * self.S + 2 * k - 1, n * self.S + 2 * k]
+        if self.osc_idx is not None:
+            rows.append(self.W)
+
+        E = np.zeros((J.shape[0], len(rows)))
+        E[rows,np.arange(len(rows))] = 1.
+        L = scipy.sparse.linalg.splu(J.tocsc()).solve(E, trans='T')
+        dX = - L.T @ Fp
+
+        dVf = dX[0:2*len(outputs):2] + 1j * dX[1:2*len(outputs):2]
+        for i, (node, k) in enumerate(outputs):
+            if k == 0:
+                dVf[i] = dX[2*i]
+            elif self.negfreqs[k]:
+                dVf[i] = np.conj(dVf[i])
+
+        dfreq = np.zeros(P)
+        if self.osc_idx is not None:
+            dfreq = self.freq * dX[-1]
+
+        return dVf, dfreq
+
+    def eval_nonlinear(self, vt, vtprev):
+        # run a time-varying oppoint analysis on the nonlinear devices,
+        # dIdV and dQdV hold the g(t) and c(t) waveforms of the node
+        # pairs that are connected by a nonlinear device
+        zero = np.zeros((1, self.St))
+        v = np.vstack((zero, vt))
+        vold = np.vstack((zero, vtprev))
+        i = np.zeros(v.shape)
+        q = np.zeros(v.shape)
+        g = collections.defaultdict(float)
+        c = collections.defaultdict(float)
+        for dev in self.nonlin_devs:
+            dev.add_hb_stamps(v, vold, i, q, g, c)
+
+        # drop 'gnd' (row and column 0)
+        dIdV = dict()
+        dQdV = dict()
+        for waveforms, x in ((dIdV, g), (dQdV, c)):
+            for (n, m), w in x.items():
+                self.add_waveform(waveforms, n - 1, m - 1, w)
+
+        return i[1:], q[1:], dIdV, dQdV
+
+    def hb_converged(self, Il, Inl):
+        abstol = self.options['abstol']
+        reltol = self.options['reltol']
+
+        F = Il + Inl
+        Frel = 2 * abs(F / (Il - Inl + 1e-15))
+        converged = not np.any((abs(F) > abstol) & (Frel > reltol))
+
+        return converged
+
+    def add_waveform(self, waveforms, n, m, x):
+        # accumulates the waveform 'x' on the node pair (n, m), 'gnd' is skipped
+        if n >= 0 and m >= 0:
+            waveforms[(n,m)] = waveforms.get((n,m), 0.) + x * np.ones(self.St)
+
+    def apply_omega(self, X):
+        # Omega is block diagonal with [[0, -w],[w, 0]] for each harmonic, so
+        # instead of a W x W product it scales the rows of each S sized block
+        w = self.omega[:,None]
+        Xo = np.zeros(X.shape)
+        Xo[...,1::2,:] = - w * X[...,2::2,:]
+        Xo[...,2::2,:] = w * X[...,1::2,:]
+        return Xo
+
+    def factorize_jacobian(self, Y, dIdV, dQdV):
+        # returns a function that solves J x = F, or None if J is singular
+        if self.options['complex_solver'] and self.is_analytic(dIdV, dQdV):
+            return self.factorize_complex_jacobian(dIdV, dQdV)
+
+        J = self.calc_jacobian(Y, dIdV, dQdV)
+        if self.options['is_sparse']:
+            try:
+                return scipy.sparse.linalg.splu(J).solve
+            except RuntimeError:
+                return None
+        else:
+            lu, piv = scipy.linalg.lu_factor(J.toarray())
+            return lambda F: scipy.linalg.lu_solve((lu, piv), F)
+
+    def factorize_complex_jacobian(self, dIdV, dQdV):
+        # Same as above for an analytic jacobian, which is block diagonal per
+        # harmonic and is factored as N(K+1) complex unknowns instead of the
+        # W real ones of the [[Re, -Im], [Im, Re]] blocks
+        pairs = list(set(dIdV) | set(dQdV))
+        g0 = np.array([np.mean(dIdV.get(p, 0.)) for p in pairs])
+        c0 = np.array([np.mean(dQdV.get(p, 0.)) for p in pairs])
+        J = self.calc_complex_jacobian(pairs, g0, c0)
+        if self.options['is_sparse']:
+            try:
+                lu = scipy.sparse.linalg.splu(J)
+            except RuntimeError:
+                return None
+            return lambda F: self.to_real(lu.solve(self.to_complex(F)))
+        else:
+            lu, piv = scipy.linalg.lu_factor(J.toarray())
+            return lambda F: self.to_real(scipy.linalg.lu_solve((lu, piv), self.to_complex(F)))
+
+    def is_analytic(self, dIdV, dQdV):
+        # The conversion matrices of g(t) and c(t) mix each phasor with the
+        # conjugate of the others (Hankel part), so the jacobian only maps
+        # phasors onto phasors (it is complex linear) when every derivative
+        # waveform is constant, e.g. linear circuits or small signal levels
+        for x in list(dIdV.values()) + list(dQdV.values()):
+            if np.ptp(x) > self.options['analytic_tol'] * np.max(np.abs(x)):
+                return False
+        return True
+
+    def calc_complex_jacobian(self, pairs, g0, c0):
+        # Y_k + G0 + j w_k C0 for every harmonic k, as a sparse matrix over
+        # the phasors X[n*(K+1)+k] of the complex formulation (see to_complex)
+        K1 = self.K + 1
+        Yc = self.calc_Yc()
+        if len(pairs) == 0:
+            return Yc
+
+        n = np.array([p[0] for p in pairs], dtype=int)
+        m = np.array([p[1] for p in pairs], dtype=int)
+        k = np.arange(K1)
+        w = np.concatenate(([0.], self.omega))
+        rows = (n[:,None] * K1 + k).ravel()
+        cols = (m[:,None] * K1 + k).ravel()
+        vals = (g0[:,None] + 1j * w[None,:] * c0[:,None]).ravel()
+        D = scipy.sparse.coo_matrix((vals, (rows, cols)), shape=Yc.shape)
+
+        return (Yc + D).tocsc()
+
+    def calc_Yc(self):
+        # Y(jw) in the complex formulation, rebuilt with the real Y
+        if self.Yc_cache is not None and self.Yc_cache[0] is self.Y_cache[1]:
+            return self.Yc_cache[1]
+
+        K1 = self.K + 1
+        k = np.arange(K1)
+        rows = (self.Yk_rows[:,None] * K1 + k).ravel()
+        cols = (self.Yk_cols[:,None] * K1 + k).ravel()
+        Yk = self.Yk.copy()
+        Yk[:,0] = Yk[:,0].real
+        Yc = scipy.sparse.coo_matrix((Yk.ravel(), (rows, cols)), shape=(self.N * K1, self.N * K1)).tocsc()
+
+        self.Yc_cache = (self.Y_cache[1], Yc)
+        return Yc
+
+    def to_complex(self, X):
+        # packed real spectra [X0, a1, b1, ...] (W x 1) to phasors ak + j bk
+        X = np.reshape(X, (self.N, self.S))
+        Xc = np.empty((self.N, self.K+1), dtype=complex)
+        Xc[:,0] = X[:,0]
+        Xc[:,1:] = X[:,1::2] + 1j * X[:,2::2]
+        return Xc.ravel()
+
+    def to_real(self, Xc):
+        Xc = np.reshape(Xc, (self.N, self.K+1))
+        X = np.empty((self.N, self.S))
+        X[:,0] = Xc[:,0].real
+        X[:,1::2] = Xc[:,1:].real
+        X[:,2::2] = Xc[:,1:].imag
+        return X.reshape(self.W, 1)
+
+    def calc_jacobian(self, Y, dIdV, dQdV):
+        # J = Y + dIdV + Omega @ dQdV assembled as a sparse matrix, with one
+        # conversion matrix per node pair waveform
+        S = self.S
+        St = self.St
+        idx = np.arange(S)
+        pairs = list(set(dIdV) | set(dQdV))
+        gt = np.array([dIdV.get(p, np.zeros(St)) for p in pairs]).reshape(-1, St)
+        ct = np.array([dQdV.get(p, np.zeros(St)) for p in pairs]).reshape(-1, St)
+        blocks = self.grid.conversion_matrix(gt) + self.apply_omega(self.grid.conversion_matrix(ct))
+
+        Yc = Y.tocoo()
+        rows = [Yc.row]
+        cols = [Yc.col]
+        vals = [Yc.data]
+        for (n,m), x in zip(pairs, blocks):
+            rows.append(np.repeat(n * S + idx, S))
+            cols.append(np.tile(m * S + idx, S))
+            vals.append(x.ravel())
+
+        rows = np.concatenate(rows)
+        cols = np.concatenate(cols)
+        vals = np.concatenate(vals)
+        J = scipy.sparse.coo_matrix((vals, (rows, cols)), shape=(self.W, self.W))
+
+        return J.tocsc()
+
+    def solve_krylov(self, Y, dIdV, dQdV, F):
+        # Solves J dV = F with GMRES without forming J. The products with
+        # dIdV and dQdV are done in the time domain on the device waveforms,
+        # and the preconditioner only keeps their DC average, which makes it
+        # block diagonal per harmonic (Y_k + G0 + j w_k C0).
+        S = self.S
+        St = self.St
+        pairs = list(set(dIdV) | set(dQdV))
+        n = np.array([p[0] for p in pairs], dtype=int)
+        m = np.array([p[1] for p in pairs], dtype=int)
+        gt = np.array([dIdV.get(p, np.zeros(St)) for p in pairs]).reshape(-1, St)
+        ct = np.array([dQdV.get(p, np.zeros(St)) for p in pairs]).reshape(-1, St)
+
+        def jvp(x):
+            x = np.ravel(x)
+            xt = self.grid.spectrum_to_time(x.reshape(self.N, S))
+            it = np.zeros((self.N, St))
+            qt = np.zeros((self.N, St))
+            np.add.at(it, n, gt * xt[m])
+            np.add.at(qt, n, ct * xt[m])
+            Inl = self.grid.time_to_spectrum(it) + self.apply_omega(self.grid.time_to_spectrum(qt)[...,None])[...,0]
+            return Y @ x + Inl.ravel()
+
+        J = scipy.sparse.linalg.LinearOperator((self.W, self.W), matvec=jvp)
+
+        """ Preconditioner """
+
+        g0 = gt.mean(axis=1)
+        c0 = ct.mean(axis=1)
+
+        if self.options['complex_solver']:
+            # the preconditioner is analytic, so it is factored in the
+            # complex formulation
+            P = self.calc_complex_jacobian(pairs, g0, c0)
+            solve = lambda x: self.to_real(lu.solve(self.to_complex(x))).ravel()
+        else:
+            idx = np.arange(S)
+            aidx = np.arange(1, S, 2)
+            wc0 = self.omega[None,:] * c0[:,None]
+
+            Yc = Y.tocoo()
+            rows = np.concatenate([Yc.row, (n[:,None] * S + idx).ravel(),
+                                   (n[:,None] * S + aidx).ravel(), (n[:,None] * S + aidx + 1).ravel()])
+            cols = np.concatenate([Yc.col, (m[:,None] * S + idx).ravel(),
+                                   (m[:,None] * S + aidx + 1).ravel(), (m[:,None] * S + aidx).ravel()])
+            vals = np.concatenate([Yc.data, np.repeat(g0, S), - wc0.ravel(), wc0.ravel()])
+            P = scipy.sparse.coo_matrix((vals, (rows, cols)), shape=(self.W, self.W)).tocsc()
+            solve = lambda x: lu.solve(x)
+
+        try:
+            lu = scipy.sparse.linalg.splu(P)
+            M = scipy.sparse.linalg.LinearOperator((self.W, self.W), matvec=solve)
+        except RuntimeError:
+            M = None
+
+        """ GMRES """
+
+        iters = [0]
+        def count(rk):
+            iters[0] += 1
+
+        kwargs = dict(restart=self.options['krylov_restart'], maxiter=self.options['krylov_maxiter'],
+                      M=M, callback=count, callback_type='pr_norm', atol=0.)
+        try:
+            dV, info = scipy.sparse.linalg.gmres(J, np.ravel(F), rtol=self.options['krylov_tol'], **kwargs)
+        except TypeError:
+            # scipy < 1.12
+            dV, info = scipy.sparse.linalg.gmres(J, np.ravel(F), tol=self.options['krylov_tol'], **kwargs)
+
+        self.krylov_iterations.append(iters[0])
+        if info < 0:
+            dV[:] = np.nan
+
+        return dV.reshape(self.W, 1)
+
+    def calc_Is(self):
+        # source vector: currents injected at the nodes by the current
+        # sources and the voltages set on the branches of the voltage sources
+        Is = np.zeros((self.N, self.S))
+        for dev in self.lin_devs:
+            if isinstance(dev, CurrentSource):
+                dc = dev.dc if dev.itype != 'ac' else 0.
+                ac = dev.ac if dev.itype != 'dc' else 0.
+                self.add_source(Is, dev, dev.n1 - 1, dc, ac, dev.phase)
+                self.add_source(Is, dev, dev.n2 - 1, -dc, -ac, dev.phase)
+
+            elif isinstance(dev, VoltageSource):
+                dc = dev.dc if dev.vtype != 'ac' else 0.
+                ac = dev.ac if dev.vtype != 'dc' else 0.
+                self.add_source(Is, dev, self.iidx[dev] - 1, dc, ac, dev.phase)
+
+            elif isinstance(dev, TransientVoltageSource):
+                if dev.vtype == 'sine':
+                    # dc + ac * sin(w t + phase)
+                    self.add_source(Is, dev, self.iidx[dev] - 1, dev.dc, dev.ac, dev.phase - np.pi / 2)
+                elif dev.vtype == 'pulse':
+                    self.add_source(Is, dev, self.iidx[dev] - 1, dev.v1, 0., 0.)
+
+        return Is.reshape(self.W, 1)
+
+    def add_source(self, Is, dev, n, dc, ac, phase):
+        # adds the DC value and the phasor of 'dev' (at dev.freq) to row 'n'
+        if n < 0:
+            return
+        Is[n,0] += dc
+        if ac == 0.:
+            return
+
+        k = self.get_freq_idx(dev.freq)
+        if k is None:
+            print('ERROR: the frequency of {} is not in the HB frequency grid'.format(dev.name))
+            return
+        x = ac * np.exp(1j * phase)
+        if self.negfreqs[k]:
+            x = np.conj(x)
+        Is[n,2*k-1] += x.real
+        Is[n,2*k] += x.imag
+
+    def get_freq_idx(self, f):
+        # index of the (lowest order) mixing product at frequency f, the
+        # vectors at -f hold the conjugate phasor
+        k = np.nonzero(np.isclose(np.abs(self.freqs[1:]), f, rtol=1e-12, atol=0.))[0] + 1
+        if len(k) == 0:
+            return None
+        return k[np.argmin(np.sum(np.abs(self.harmonics[k]), axis=1))]
+
+    def calc_Y(self):
+        # The linear part is kept as one N x N complex matrix per harmonic,
+        # Yk (nnz x K+1) in COO form over the node pairs (rows, cols). Each
+        # device is only evaluated again when its values or the frequency
+        # grid change, and Y is rebuilt only when some device changed.
+        freqs = np.abs(self.freqs)
+        devs = [dev for dev in self.lin_devs
+                if hasattr(dev, 'get_mthb_admittance') and callable(dev.get_mthb_admittance)]
+
+        changed = False
+        cache = {}
+        for dev in devs:
+            key = (get_device_key(dev), self.iidx.get(dev), freqs.tobytes())
+            entry = self.admittance_cache.get(id(dev))
+            if entry is None or entry[0] != key:
+                if dev in self.iidx:
+                    rows, cols, y = dev.get_mthb_admittance(freqs, self.iidx[dev])
+                else:
+                    rows, cols, y = dev.get_mthb_admittance(freqs)
+                rows = np.asarray(rows, dtype=int)
+                cols = np.asarray(cols, dtype=int)
+                valid = (rows > 0) & (cols > 0)
+                entry = (key, rows[valid] - 1, cols[valid] - 1, np.asarray(y)[valid])
+                changed = True
+            cache[id(dev)] = entry
+        self.admittance_cache = cache
+
+        topology = (tuple(id(dev) for dev in devs), self.N, self.K, self.negfreqs.tobytes())
+        if not changed and self.Y_cache is not None and self.Y_cache[0] == topology:
+            return self.Y_cache[1]
+
+        entries = [cache[id(dev)] for dev in devs]
+        rows = np.concatenate([e[1] for e in entries] + [np.zeros(0, dtype=int)])
+        cols = np.concatenate([e[2] for e in entries] + [np.zeros(0, dtype=int)])
+        self.Yk = np.concatenate([e[3] for e in entries] + [np.zeros((0, self.K+1))])
+        # the devices are evaluated at |f|, Y(-f) = conj(Y(f))
+        self.Yk[:,self.negfreqs] = np.conj(self.Yk[:,self.negfreqs])
+        self.Yk_rows = rows
+        self.Yk_cols = cols
+
+        # W x W indices of the stamps, [DC, (a,a), (a,b), (b,a), (b,b)]
+        pattern = (topology, rows.tobytes(), cols.tobytes())
+        if self.Y_pattern is None or self.Y_pattern[0] != pattern:
+            S = self.S
+            k = 2 * np.arange(self.K) + 1
+            r = (rows[:,None] * S + k).ravel()
+            c = (cols[:,None] * S + k).ravel()
+            I = np.concatenate((rows * S, r, r, r + 1, r + 1))
+            J = np.concatenate((cols * S, c, c + 1, c, c + 1))
+            self.Y_pattern = (pattern, I, J)
+        _, I, J = self.Y_pattern
+
+        Yr = self.Yk[:,1:].real.ravel()
+        Yi = self.Yk[:,1:].imag.ravel()
+        vals = np.concatenate((self.Yk[:,0].real, Yr, -Yi, Yi, Yr))
+        Y = scipy.sparse.coo_matrix((vals, (I, J)), shape=(self.W, self.W)).tocsr()
+
+        self.Y_cache = (topology, Y)
+        return Y
+
+    def calc_V0(self):
+        # DC solution as the initial guess (see calc_tahb_V0 for the
+        # transient-assisted one)
+        X = DC('HB.DC').run(self.netlist)
+        V = np.zeros((self.W,1))
+        for n in range(self.N):
+            V[n*self.S] = X[n]
+
+        return V
+
+    def calc_tahb_V0(self):
+        # Transient-assisted initial guess: the circuit is simulated for a
+        # few periods of the HB grid starting from the DC solution, and the
+        # spectra are fitted to the node voltages over the last period
+        freqs = self.harmonics @ self.tones
+        fabs = np.unique(np.abs(freqs))
+        T = 1. / np.min(np.diff(fabs))
+        tstep = 1. / (self.options['tahb_points'] * fabs[-1])
+        tstop = self.options['tahb_periods'] * T
+        if tstop / tstep > self.options['tahb_max_points']:
+            logger.warning('{}: the transient initial guess needs too many time steps, using DC.'.format(self.name))
+            return None
+
+        tran = Transient(self.name + '.TAHB', tstop, tstep)
+        try:
+            xtran = tran.run(self.netlist.copy())
+        except Exception:
+            logger.warning('{}: transient initial guess failed, using DC.'.format(self.name))
+            return None
+        if tran.time[-1] < tstop * (1. - 1e-9):
+            logger.warning('{}: transient initial guess failed, using DC.'.format(self.name))
+            return None
+
+        # resample the last period on a uniform grid and fit
+        # v(t) = X0 + sum ak cos(wk t) - bk sin(wk t) by least squares
+        M = max(2 * self.S, int(np.ceil(T / tstep)))
+        t = tran.time[-1] - T + T * np.arange(M) / M
+        vt = np.array([np.interp(t, tran.time, xtran[:,n,0]) for n in range(self.N)])
+
+        wt = 2 * np.pi * t[:,None] * freqs[None,1:]
+        B = np.empty((M, self.S))
+        B[:,0] = 1.
+        B[:,1::2] = np.cos(wt)
+        B[:,2::2] = - np.sin(wt)
+        X = np.linalg.lstsq(B, vt.T, rcond=None)[0]
+
+        print('Transient initial guess: {} time steps'.format(len(tran.time)))
+
+        return X.T.reshape(self.W, 1)
+
+    def get_waveform(self, xt, n):
+        # time samples of node 'n' (xt has shape (N,St)), zero for 'gnd'
+        return xt[n] if n >= 0 else np.zeros(self.St)
+
+    def ifft(self, X):
+        # transform all nodes at once
+        xt = self.grid.spectrum_to_time(X.reshape(self.N, self.S))
+        return xt.reshape(self.N * self.St, 1)
+
+    def fft(self, xt):
+        X = self.grid.time_to_spectrum(xt.reshape(self.N, self.St))
+        return X.reshape(self.W, 1)
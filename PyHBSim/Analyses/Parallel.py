@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import importlib
+import traceback
+import concurrent.futures
+
+import numpy as np
+
+from PyHBSim.Netlist import Netlist
+from PyHBSim.Analyses.MultiToneHarmonicBalance import MultiToneHarmonicBalance
+from PyHBSim.Utils import hb_logger as logger
+
+import logging
+logger.setLevel(logging.INFO)
+
+options = dict()
+options['max_workers'] = None   # defaults to the number of processors
+options['chunksize'] = 1
+options['quiet'] = True         # silence the solver output inside the workers
+
+# modules whose options dicts are read by the analyses at run time (or
+# copied by the devices that a netlist factory builds in the worker), a
+# snapshot of them is shipped with every job so that the workers see the
+# same settings as the parent process regardless of the start method
+option_modules = ['PyHBSim.Analyses.HarmonicBalanceCore',
+                  'PyHBSim.Analyses.Continuation',
+                  'PyHBSim.Analyses.Transient',
+                  'PyHBSim.Analyses.Solver',
+                  'PyHBSim.Analyses.DC',
+                  'PyHBSim.Analyses.AC',
+                  'PyHBSim.Devices.Diode',
+                  'PyHBSim.Devices.BJT',
+                  'PyHBSim.Devices.Mosfet']
+
+def get_module_options():
+    return {m: importlib.import_module(m).options.copy() for m in option_modules}
+
+def set_module_options(module_options):
+    for m, opts in module_options.items():
+        importlib.import_module(m).options.update(opts)
+
+def run_job(job):
+    # executed in the worker processes: rebuilds the analysis from its
+    # settings (LU factors and the like are not picklable) and runs it
+    kind, netlist, hb_settings, module_options, args, quiet = job
+
+    set_module_options(module_options)
+
+    hb = MultiToneHarmonicBalance(hb_settings['name'], hb_settings['freq'], hb_settings['numharmonics'])
+    hb.options.update(hb_settings['options'])
+
+    stdout = sys.stdout
+    t0 = time.time()
+    try:
+        if quiet:
+            sys.stdout = open(os.devnull, 'w')
+        if callable(netlist):
+            netlist = netlist()
+        if kind == 'osc':
+            converged, freqs, Vf, _, _ = hb.run_oscillator(netlist, *args)
+            fosc = hb.freq
+        else:
+            converged, freqs, Vf, _, _ = hb.run(netlist, *args)
+            fosc = 0.
+        error = None
+    except Exception:
+        converged, freqs, Vf, fosc = False, None, None, 0.
+        error = traceback.format_exc()
+    finally:
+        if quiet:
+            sys.stdout.close()
+        sys.stdout = stdout
+    elapsed = time.time() - t0
+
+    nodes = netlist.node_idx_to_name[1:] if isinstance(netlist, Netlist) else []
+    nr_iterations = getattr(hb, 'nr_iterations', 0)
+
+    return converged, freqs, Vf, fosc, nodes, nr_iterations, elapsed, error
+
+class Parallel():
+    """
+    Runs independent harmonic balance analyses over a pool of processes.
+
+    The jobs are netlists, or picklable callables (e.g. module level
+    functions or functools.partial objects) that build one. Every job is
+    solved by a fresh MultiToneHarmonicBalance configured as 'hb', and the
+    results are returned in the order of the jobs.
+    """
+
+    def __init__(self, name, hb):
+        self.name = name
+
+        # analysis parameters
+        self.hb = hb
+
+        # output data (one entry per job)
+        self.converged = None
+        self.freqs = None
+        self.Vf = None
+        self.fosc = None
+        self.nodes = None
+        self.nr_iterations = None
+        self.times = None
+        self.errors = None
+
+        self.options = options.copy()
+
+    def get_v(self, i, node):
+        # spectrum of 'node' in the i-th job
+        n = self.nodes[i].index(node)
+        return self.Vf[i][n,:]
+
+    def run(self, netlists, V0=None):
+        # forced (driven) harmonic balance of each netlist
+        return self.map('hb', netlists, (V0,))
+
+    def run_oscillator(self, netlists, f0, numharmonics, V0, node):
+        # autonomous harmonic balance of each netlist
+        return self.map('osc', netlists, (f0, numharmonics, V0, node))
+
+    def map(self, kind, netlists, args):
+        hb_settings = {'name': self.hb.name,
+                       'freq': self.hb.freq,
+                       'numharmonics': self.hb.numharmonics,
+                       'options': self.hb.options.copy()}
+        module_options = get_module_options()
+        jobs = [(kind, netlist, hb_settings, module_options, args, self.options['quiet'])
+                for netlist in netlists]
+
+        t0 = time.time()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.options['max_workers']) as executor:
+            results = list(executor.map(run_job, jobs, chunksize=self.options['chunksize']))
+        elapsed = time.time() - t0
+
+        self.converged = np.array([r[0] for r in results], dtype=bool)
+        self.freqs = [r[1] for r in results]
+        self.Vf = [r[2] for r in results]
+        self.fosc = np.array([r[3] for r in results])
+        self.nodes = [r[4] for r in results]
+        self.nr_iterations = np.array([r[5] for r in results])
+        self.times = np.array([r[6] for r in results])
+        self.errors = [r[7] for r in results]
+
+        for i, error in enumerate(self.errors):
+            if error is not None:
+                logger.warning('{}: job {} failed:\n{}'.format(self.name, i, error))
+
+        print('{}: {} jobs ({} converged) in {:.2f} s, {:.2f} s of solver time'.format(
+            self.name, len(jobs), np.sum(self.converged), elapsed, np.sum(self.times)))
+
+        return np.all(self.converged), self.freqs, self.Vf
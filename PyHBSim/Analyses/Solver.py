@@ -3,6 +3,10 @@ import scipy.sparse
 import scipy.sparse.linalg
 import numpy as np
 
+options = dict()
+options['sparse_size'] = 200      # 'auto' uses the sparse LU from this number of unknowns on
+options['permc_spec'] = 'COLAMD'  # fill-reducing column ordering of the sparse LU
+
 def solve_linear(A, z, is_sparse=False):
     if is_sparse == True:
         An = scipy.sparse.csc_matrix(A)
@@ -12,4 +16,112 @@ def solve_linear(A, z, is_sparse=False):
         lu, piv = scipy.linalg.lu_factor(A)
         x = scipy.linalg.lu_solve((lu, piv), z)
 
-    return x, not np.isnan(np.sum(x))
\ No newline at end of file
+    return x, not np.isnan(np.sum(x))
+
+class LinearSolver():
+    """
+    LU solver of the MNA systems of one circuit topology.
+
+    'is_sparse' may be True, False or 'auto', which picks the sparse LU
+    from 'sparse_size' unknowns on. The sparse LU computes the fill-reducing
+    column ordering with the first matrix and keeps it, together with the
+    index arrays that permute the columns of the matrices with the same
+    pattern, so that later factorizations are only the numeric LU of the
+    permuted matrix. A matrix equal to the last one factored (e.g. a linear
+    circuit at a constant time step) reuses its factors.
+    """
+
+    def __init__(self, name, size, is_sparse='auto'):
+        self.name = name
+        self.size = size
+
+        self.options = options.copy()
+
+        if is_sparse == 'auto':
+            is_sparse = size >= self.options['sparse_size']
+        self.is_sparse = bool(is_sparse)
+
+        self.A = None          # last matrix factored (dense or CSC)
+        self.lu = None         # its factors
+        self.perm = None       # column ordering of the sparse LU
+        self.indptr = None     # pattern the ordering was computed for
+        self.indices = None
+        self.take = None       # data of the column permuted matrix
+        self.pindptr = None
+        self.pindices = None
+        self.permuted = False  # the factors are of the column permuted matrix
+
+        # statistics
+        self.num_factorizations = 0
+        self.num_orderings = 0
+
+    def solve(self, A, z):
+        if not self.is_same(A):
+            try:
+                self.factorize(A)
+            except RuntimeError:
+                # singular matrix
+                self.A = None
+                return np.full(np.shape(z), np.nan), False
+        x = self.solve_factored(z)
+        return x, not np.isnan(np.sum(x))
+
+    def is_same(self, A):
+        if self.A is None:
+            return False
+        if self.is_sparse:
+            return (np.array_equal(A.indptr, self.A.indptr) and
+                    np.array_equal(A.indices, self.A.indices) and
+                    np.array_equal(A.data, self.A.data))
+        return np.array_equal(A, self.A)
+
+    def factorize(self, A):
+        self.num_factorizations += 1
+        if not self.is_sparse:
+            self.A = np.array(A)
+            self.lu = scipy.linalg.lu_factor(self.A)
+            return
+
+        A = scipy.sparse.csc_matrix(A)
+        A.sort_indices()
+        self.A = A.copy()
+        if not self.is_ordered(A):
+            self.order(A)
+            return
+        data = A.data[self.take]
+        P = scipy.sparse.csc_matrix((data, self.pindices, self.pindptr), shape=A.shape)
+        self.lu = scipy.sparse.linalg.splu(P, permc_spec='NATURAL')
+        self.permuted = True
+
+    def is_ordered(self, A):
+        return (self.perm is not None and
+                np.array_equal(A.indptr, self.indptr) and
+                np.array_equal(A.indices, self.indices))
+
+    def order(self, A):
+        # factors A with the fill-reducing ordering, whose columns are then
+        # gathered once into the index arrays of the permuted pattern
+        self.num_orderings += 1
+        lu = scipy.sparse.linalg.splu(A, permc_spec=self.options['permc_spec'])
+        self.perm = np.argsort(lu.perm_c)
+        self.indptr = A.indptr.copy()
+        self.indices = A.indices.copy()
+
+        counts = np.diff(A.indptr)[self.perm]
+        self.pindptr = np.concatenate(([0], np.cumsum(counts)))
+        self.take = np.repeat(A.indptr[self.perm] - self.pindptr[:-1], counts) + np.arange(self.pindptr[-1])
+        self.pindices = A.indices[self.take]
+
+        # the first factors are used as they are
+        self.lu = lu
+        self.permuted = False
+
+    def solve_factored(self, z):
+        if not self.is_sparse:
+            return scipy.linalg.lu_solve(self.lu, z)
+        y = self.lu.solve(z)
+        if not self.permuted:
+            return y
+        x = np.empty(y.shape, dtype=y.dtype)
+        x[self.perm] = y
+        return x
@@ -0,0 +1,226 @@
+import numpy as np
+import scipy.sparse
+
+class StampPlan():
+    """
+    Compiled stamp pattern of the MNA matrix.
+
+    The linear devices that have constant stamps (get_mna_stamps) are
+    collected once into the layers 'G' and 'C', so that the matrix is
+    G + s C, where s = j w in the AC analysis and 2 / h for the trapezoidal
+    rule of the transient analysis. The remaining devices stamp into other
+    layers of the plan with the usual A[i][j] = A[i][j] + g indexing on
+    the layer's 'A'.
+
+    For sparse matrices the layers are StampLayer objects: the first stamp
+    of an entry gives it a slot in the values vector of every layer, after
+    that a stamp only writes its slot. The index arrays of the pattern are
+    compiled once, so 'get_matrix' builds the matrix (without the 'gnd' row
+    and column) from a weighted sum of the values vectors in a single
+    scatter. Small circuits are solved with dense matrices, and there the
+    layers are plain dense arrays (see DenseLayer).
+    """
+
+    def __init__(self, name, size, dtype=float, is_sparse=True):
+        self.name = name
+        self.size = size    # number of MNA rows including 'gnd'
+        self.dtype = dtype
+        self.is_sparse = is_sparse
+
+        self.slots = [dict() for i in range(size)] # slots[i][j] is the slot of A[i][j]
+        self.rows = []      # row of each slot
+        self.cols = []      # column of each slot
+
+        self.nnz = 0        # number of slots when the plan was compiled
+        self.keep = None    # slots off the 'gnd' row and column
+        self.order = None   # their order in the CSC matrix
+        self.indices = None
+        self.indptr = None
+
+        # constant stamps of the linear devices
+        self.G = self.new_layer()
+        self.C = self.new_layer()
+
+    def new_layer(self):
+        if self.is_sparse:
+            return StampLayer(self)
+        return DenseLayer(self)
+
+    def add_devices(self, devs, iidx):
+        # adds the G and C stamps of the devices that have them and returns
+        # the other devices, which have to be stamped by the analysis
+        stamped = []
+        for dev in devs:
+            idx = iidx[dev] if dev in iidx else None
+            stamps = dev.get_mna_stamps(idx) if hasattr(dev, 'get_mna_stamps') else None
+            if stamps is None:
+                stamped.append(dev)
+                continue
+            for i, j, g, c in zip(*stamps):
+                self.G[i,j] = self.G[i,j] + g
+                self.C[i,j] = self.C[i,j] + c
+        return stamped
+
+    def get_slot(self, i, j):
+        s = self.slots[i].get(j)
+        if s is None:
+            s = len(self.rows)
+            self.slots[i][j] = s
+            self.rows.append(i)
+            self.cols.append(j)
+        return s
+
+    def compile(self):
+        n = self.size - 1
+        rows = np.array(self.rows, dtype=int)
+        cols = np.array(self.cols, dtype=int)
+        self.keep = np.nonzero((rows > 0) & (cols > 0))[0]
+        r = rows[self.keep] - 1
+        c = cols[self.keep] - 1
+
+        # the slots are unique, so the CSC arrays are just the pattern
+        # sorted by column and row
+        self.order = np.lexsort((r, c))
+        self.indices = r[self.order]
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(c, minlength=n))))
+        self.nnz = len(self.rows)
+
+    def get_values(self, layers, weights=None):
+        if self.keep is None or self.nnz != len(self.rows):
+            self.compile()
+        if weights is None:
+            weights = [1.] * len(layers)
+        v = None
+        for layer, w in zip(layers, weights):
+            if w == 0.:
+                continue
+            vals = layer.get_values(self.nnz)
+            if w != 1.:
+                vals = w * vals
+            v = vals if v is None else v + vals
+        if v is None:
+            v = np.zeros(self.nnz, dtype=self.dtype)
+        return v[self.keep]
+
+    def get_matrix(self, layers, weights=None):
+        # weighted sum of the layers without the 'gnd' row and column
+        n = self.size - 1
+        if not self.is_sparse:
+            if weights is None:
+                weights = [1.] * len(layers)
+            A = np.zeros((n, n), dtype=self.dtype)
+            for layer, w in zip(layers, weights):
+                if w != 0.:
+                    A = A + w * layer.A[1:,1:]
+            return A
+        v = self.get_values(layers, weights)
+        return scipy.sparse.csc_matrix((v[self.order], self.indices, self.indptr), shape=(n, n))
+
+    def get_rhs(self, layers):
+        z = layers[0].z[1:]
+        for layer in layers[1:]:
+            z = z + layer.z[1:]
+        return z
+
+class DenseLayer():
+    """
+    Dense MNA matrix 'A' and right hand side 'z' of a StampPlan.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.A = np.zeros((plan.size, plan.size), dtype=plan.dtype)
+        self.z = np.zeros((plan.size, 1), dtype=plan.dtype)
+
+    def clear(self):
+        self.A[:,:] = 0.
+        self.z[:] = 0.
+
+    def copy(self):
+        layer = DenseLayer(self.plan)
+        layer.A = self.A.copy()
+        layer.z = self.z.copy()
+        return layer
+
+    def __getitem__(self, key):
+        return self.A[key]
+
+    def __setitem__(self, key, value):
+        self.A[key] = value
+
+class StampLayer():
+    """
+    Values of the entries of a StampPlan, indexed like the dense MNA
+    matrix (A[i][j] or A[i,j]), together with a dense right hand side 'z'.
+    Reading an entry that was never stamped gives zero.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.A = self # what the devices stamp into
+        self.vals = np.zeros(max(16, len(plan.rows)), dtype=plan.dtype)
+        self.z = np.zeros((plan.size, 1), dtype=plan.dtype)
+        self.rowviews = [StampRow(self, i, plan.slots[i]) for i in range(plan.size)]
+
+    def clear(self):
+        self.vals[:] = 0.
+        self.z[:] = 0.
+
+    def copy(self):
+        layer = StampLayer(self.plan)
+        layer.vals = self.vals.copy()
+        layer.z = self.z.copy()
+        return layer
+
+    def get(self, i, j):
+        s = self.plan.slots[i].get(j)
+        if s is None or s >= len(self.vals):
+            return 0.
+        return self.vals[s]
+
+    def set(self, i, j, value):
+        s = self.plan.get_slot(i, j)
+        if s >= len(self.vals):
+            vals = np.zeros(max(2 * len(self.vals), s + 1), dtype=self.vals.dtype)
+            vals[:len(self.vals)] = self.vals
+            self.vals = vals
+        self.vals[s] = value
+
+    def get_values(self, nnz):
+        if len(self.vals) >= nnz:
+            return self.vals[:nnz]
+        vals = np.zeros(nnz, dtype=self.vals.dtype)
+        vals[:len(self.vals)] = self.vals
+        return vals
+
+    def __getitem__(self, key):
+        try:
+            return self.rowviews[key]
+        except TypeError:
+            # A[i,j]
+            return self.get(*key)
+
+    def __setitem__(self, key, value):
+        self.set(key[0], key[1], value)
+
+class StampRow():
+
+    def __init__(self, layer, i, slots):
+        self.layer = layer
+        self.i = i
+        self.slots = slots
+
+    def __getitem__(self, j):
+        s = self.slots.get(j)
+        vals = self.layer.vals
+        if s is None or s >= len(vals):
+            return 0.
+        return vals[s]
+
+    def __setitem__(self, j, value):
+        s = self.slots.get(j)
+        vals = self.layer.vals
+        if s is None or s >= len(vals):
+            self.layer.set(self.i, j, value)
+        else:
+            vals[s] = value
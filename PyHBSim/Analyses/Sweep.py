@@ -0,0 +1,166 @@
+import numpy as np
+
+from PyHBSim.Utils import hb_logger as logger
+
+import logging
+logger.setLevel(logging.INFO)
+
+options = dict()
+options['use_predictor'] = True  # secant extrapolation from the last two points
+options['fast_iterations'] = 4   # grow the step if Newton takes up to this
+options['slow_iterations'] = 10  # shrink the step if Newton takes more than this
+options['step_growth'] = 2.      # factor used to grow/shrink the step
+options['min_step'] = 1e-3       # smallest step relative to the spacing of the values
+options['miniter'] = 1           # minimum number of NR iterations of the corrector
+options['reltol'] = 1e-9         # values closer than this to the target are snapped to it
+
+class Sweep():
+    """
+    Harmonic balance sweep over a device parameter.
+
+    Each point is warm-started from the previous solutions with a secant
+    predictor. When Newton fails the step towards the next value is
+    halved, and it grows back while the corrector converges quickly.
+    """
+
+    def __init__(self, name, hb, device, param, values):
+        self.name = name
+
+        # analysis parameters
+        self.hb = hb
+        self.device = device
+        self.param = param
+        self.values = np.array(values, dtype=float)
+
+        # output data
+        self.converged = None
+        self.freqs = None
+        self.Vf = None
+        self.nr_iterations = 0
+
+        self.options = options.copy()
+
+    def set_param(self, value):
+        self.hb.set_param(self.device, self.param, value)
+
+    def get_v(self, node):
+        # spectra of 'node' for all the points of the sweep
+        n = self.hb.get_node_idx(node)
+        return self.Vf[:,n,:]
+
+    def run(self, netlist):
+        # forced (driven) harmonic balance at each value
+        def solve(V, f):
+            Is, Y = self.hb.setup(netlist)
+            V, converged = self.hb.hb_loop(Is, Y, V)
+            if converged:
+                self.hb.set_solution(V)
+            return V, converged
+
+        def solve_first():
+            converged, _, _, _, _ = self.hb.run(netlist)
+            return converged
+
+        return self.sweep(solve, solve_first)
+
+    def run_oscillator(self, netlist, f0, numharmonics, V0, node):
+        # autonomous harmonic balance at each value, the frequency of
+        # oscillation is extrapolated together with the spectra
+        def solve(V, f):
+            self.hb.freq = f
+            Is, Y = self.hb.setup(netlist)
+            V, converged = self.hb.osc_loop(Is, Y, V, self.hb.get_node_idx(node))
+            if converged:
+                self.hb.set_solution(V)
+            return V, converged
+
+        def solve_first():
+            converged, _, _, _, _ = self.hb.run_oscillator(netlist, f0, numharmonics, V0, node)
+            return converged
+
+        return self.sweep(solve, solve_first)
+
+    def sweep(self, solve, solve_first):
+        P = len(self.values)
+        growth = self.options['step_growth']
+
+        self.converged = np.zeros(P, dtype=bool)
+        self.fosc = np.zeros(P)
+        self.freqs = None
+        self.Vf = None
+        self.nr_iterations = 0
+
+        # history of converged points (param, V, freq) used by the predictor
+        history = []
+
+        def store(i):
+            if self.Vf is None:
+                self.freqs = np.zeros((P,) + self.hb.freqs.shape)
+                self.Vf = np.full((P,) + self.hb.Vf.shape, np.nan, dtype=complex)
+            self.converged[i] = True
+            self.fosc[i] = self.hb.freq if np.isscalar(self.hb.freq) else 0.
+            self.freqs[i] = self.hb.freqs
+            self.Vf[i] = self.hb.Vf
+
+        """ First point """
+
+        self.set_param(self.values[0])
+        if not solve_first():
+            logger.warning('{}: first point of the sweep did not converge.'.format(self.name))
+            return False, self.values, self.freqs, self.Vf
+        self.nr_iterations += self.hb.nr_iterations
+        history.append((self.values[0], self.hb.V.copy(), self.hb.freq))
+        store(0)
+
+        """ Remaining points with predictor / corrector """
+
+        i = 1
+        h = abs(self.values[1] - self.values[0]) if P > 1 else 0.
+        while i < P:
+            p, V, f = history[-1]
+            target = self.values[i]
+            spacing = abs(target - self.values[i-1])
+            pnext = p + np.sign(target - p) * min(h, abs(target - p))
+            if abs(pnext - target) <= self.options['reltol'] * max(abs(target), spacing):
+                pnext = target
+
+            # secant predictor
+            if self.options['use_predictor'] and len(history) > 1:
+                pa, Va, fa = history[-2]
+                r = (pnext - p) / (p - pa)
+                Vpred = V + r * (V - Va)
+                fpred = f + r * (f - fa) if np.isscalar(f) else f
+            else:
+                Vpred = V.copy()
+                fpred = f
+
+            self.set_param(pnext)
+            print('{}: {} = {:.6e}'.format(self.name, self.param, pnext))
+            miniter = self.hb.options['miniter']
+            self.hb.options['miniter'] = self.options['miniter']
+            try:
+                Vnew, converged = solve(Vpred, fpred)
+            finally:
+                self.hb.options['miniter'] = miniter
+            self.nr_iterations += self.hb.nr_iterations
+
+            if converged:
+                history.append((pnext, Vnew.copy(), self.hb.freq))
+                history = history[-2:]
+                if pnext == target:
+                    store(i)
+                    i += 1
+
+                if self.hb.nr_iterations <= self.options['fast_iterations']:
+                    h = h * growth
+                elif self.hb.nr_iterations > self.options['slow_iterations']:
+                    h = h / growth
+            else:
+                h = h / growth
+                if h < self.options['min_step'] * spacing:
+                    logger.warning('{}: sweep stopped at {} = {}.'.format(self.name, self.param, p))
+                    break
+
+        print('{}: total number of NR iterations: {}'.format(self.name, self.nr_iterations))
+
+        return np.all(self.converged), self.values, self.freqs, self.Vf
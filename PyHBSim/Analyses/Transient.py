@@ -3,14 +3,15 @@ import numpy as np
 
 from PyHBSim.Devices import *
 from PyHBSim.Analyses import DC
-from PyHBSim.Analyses.Solver import solve_linear
+from PyHBSim.Analyses.Solver import LinearSolver
+from PyHBSim.Analyses.StampPlan import StampPlan
 from PyHBSim.Utils import tr_logger as logger
 
 import logging
 logger.setLevel(logging.WARNING)
 
 options = dict()
-options['is_sparse'] = False
+options['is_sparse'] = 'auto'   # True, False or 'auto' (by the size of the circuit)
 options['max_iterations'] = 150
 options['gmin'] = 1e-12
 
@@ -54,11 +55,30 @@ class Transient():
         self.n = netlist.get_num_nodes()
         self.m = netlist.get_num_vsources()
         self.devs = netlist.get_devices()
+        self.lin_devs = netlist.get_linear_devices()
+        self.nonlin_devs = netlist.get_nonlinear_devices()
         self.iidx = netlist.get_mna_extra_rows_dict()
 
-        # create MNA matrices
-        A = np.zeros((self.n+self.m, self.n+self.m))
-        z = np.zeros((self.n+self.m, 1))
+        # create MNA matrices: the devices with constant stamps go to the G
+        # and C matrices of the plan, the other linear devices (sources)
+        # only depend on the previous time points, so they are stamped once
+        # per time step, and the nonlinear devices at every Newton iteration
+        solver = LinearSolver(self.name, self.n+self.m-1, self.options['is_sparse'])
+        plan = StampPlan(self.name, self.n+self.m, is_sparse=solver.is_sparse)
+        lin_devs = plan.add_devices(self.lin_devs, self.iidx)
+        Alin = plan.new_layer()
+        Anl = plan.new_layer()
+
+        # same gmin as in the DC analysis, nodes that are only connected
+        # through gyrators would leave A singular
+        Agmin = plan.new_layer()
+        for i in range(self.n):
+            Agmin[i,i] = self.options['gmin']
+
+        # the trapezoidal rule for G x + C dx/dt = b gives
+        #   (G + 2 C / h) x(n+1) = b(n+1) + 2 C / h x(n) + ic(n)
+        # where ic = C dx/dt is updated from each accepted point
+        C = plan.get_matrix([plan.C])
 
         # perform DC simulation if no operating point is provided
         if x0 is None:
@@ -89,6 +109,7 @@ class Transient():
         tstep = 1e-12       # time step
         xtran = [self.xdc]  # output data
         time  = [t]         # output time array
+        ic = np.zeros(self.xdc.shape)
         while t < self.tstop:
             # increment time step
             t = t + tstep
@@ -96,25 +117,34 @@ class Transient():
             # use last transient point as initial condition for finding the next
             xk = xtran[-1]
 
+            # add transient stamps of the linear devices to MNA
+            Alin.clear()
+            for dev in lin_devs:
+                idx = self.iidx[dev] if dev in self.iidx else None
+                dev.add_tran_stamps(Alin.A, Alin.z, xk, idx, xtran, t, tstep)
+            Alin.z[1:] += 2. / tstep * (C @ xk) + ic
+
             converged = False
             k = 0
             while (not converged) and (k < maxiter):
                 # refresh matrices
-                A[:,:] = 0.0
-                z[:] = 0.0
+                Anl.clear()
 
-                # calculate nonlinear devices operating point at 'k' iteration
-                for dev in self.devs:
-                    if dev.is_nonlinear():
-                        dev.calc_oppoint(xk)
+                # calculate nonlinear devices operating point at 'k' iteration,
+                # with the voltage limiting that 'check_vlimit' relies on
+                for dev in self.nonlin_devs:
+                    dev.calc_oppoint(xk, True)
 
-                # add transient stamps to MNA
-                for dev in self.devs:
+                # add transient stamps of the nonlinear devices to MNA
+                for dev in self.nonlin_devs:
                     idx = self.iidx[dev] if dev in self.iidx else None
-                    dev.add_tran_stamps(A, z, xk, idx, xtran, t, tstep)
+                    dev.add_tran_stamps(Anl.A, Anl.z, xk, idx, xtran, t, tstep)
 
                 # solve linear system
-                x, issolved = solve_linear(A[1:,1:], z[1:])
+                A = plan.get_matrix([plan.G, plan.C, Alin, Anl, Agmin],
+                                    [1., 2. / tstep, 1., 1., 1.])
+                z = plan.get_rhs([Alin, Anl])
+                x, issolved = solver.solve(A, z)
 
                 if not issolved:
                     logger.debug('Failed to resolve linear system! Solution has NaN ...')
@@ -157,6 +187,7 @@ class Transient():
 
             if converged:
                 # save solution
+                ic = 2. / tstep * (C @ (x - xtran[-1])) - ic
                 time.append(t)
                 xtran.append(x)
                 j = j + 1
@@ -1,5 +1,9 @@
 from .DC import DC
 from .AC import AC
 from .Transient import Transient
+from .Continuation import Continuation
+from .HarmonicBalanceCore import HarmonicBalanceCore
 from .HarmonicBalance import HarmonicBalance
 from .MultiToneHarmonicBalance import MultiToneHarmonicBalance
+from .Sweep import Sweep
+from .Parallel import Parallel
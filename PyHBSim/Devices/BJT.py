@@ -210,33 +210,46 @@ class BJT():
     def add_tran_stamps(self, A, z, x, iidx, xt, t, tstep):
         self.add_dc_stamps(A, z, x, iidx)
 
-    def add_hb_stamps(self, v, i, g, k):
-        B = self.n1 
-        C = self.n2 
-        E = self.n3 
-
-        # calculate currents at the BJT
-        Vb = v[B-1,k] if B > 0 else 0
-        Vc = v[C-1,k] if C > 0 else 0
-        Ve = v[E-1,k] if E > 0 else 0
+    def add_hb_stamps(self, v, vold, i, q, g, c):
+        # Harmonic balance stamps for all the time samples at once: v and
+        # vold hold the node voltages of this and the previous iteration
+        # (row 0 is 'gnd'), the device currents and charges are added to i
+        # and q, and their derivatives to the node pair waveforms g and c.
+        B = self.n1
+        C = self.n2
+        E = self.n3
         Vs = 0
 
-        Ib, Ic, Ie = self.get_i(Vb, Vc, Ve, Vs)
-        gmu, gpi, gmf, gmr = self.get_g(Vb, Vc, Ve, Vs)
-
-        g[B,B,k] = g[B,B,k] + gmu + gpi
-        g[B,C,k] = g[B,C,k] - gmu
-        g[B,E,k] = g[B,E,k] - gpi
-        g[C,B,k] = g[C,B,k] - gmu + gmf + gmr
-        g[C,C,k] = g[C,C,k] + gmu - gmr
-        g[C,E,k] = g[C,E,k] - gmf
-        g[E,B,k] = g[E,B,k] - gpi - gmf - gmr
-        g[E,C,k] = g[E,C,k] + gmr
-        g[E,E,k] = g[E,E,k] + gpi + gmf
-
-        i[B,k] = i[B,k] + Ib
-        i[C,k] = i[C,k] + Ic
-        i[E,k] = i[E,k] - Ie
+        Ib, Ic, Ie, Qbe, Qbc, Qsc, gmu, gpi, gmf, gmr, Cbc, Cbe, Cbebc, Csc = \
+            self.get_hb_params(v[B], v[C], v[E], Vs, vold[B], vold[C], vold[E])
+
+        self.Ic = Ic
+
+        g[B,B] += gmu + gpi
+        g[B,C] -= gmu
+        g[C,B] += - gmu + gmf + gmr
+        g[B,E] -= gpi
+        g[E,B] -= gpi + gmf + gmr
+        g[C,C] += gmu - gmr
+        g[C,E] -= gmf
+        g[E,C] += gmr
+        g[E,E] += gpi + gmf
+
+        c[B,B] += Cbc + Cbe + Cbebc
+        c[B,C] -= Cbc + Cbebc
+        c[C,B] -= Cbc
+        c[B,E] -= Cbe
+        c[E,B] -= Cbe + Cbebc
+        c[C,C] += Cbc + Csc
+        c[E,C] += Cbebc
+        c[E,E] += Cbe
+
+        i[B] += Ib
+        i[C] += Ic
+        i[E] -= Ie
+        q[B] += Qbe + Qbc
+        q[C] -= Qbc - Qsc # TODO: the sign of Qsc might be wrong
+        q[E] -= Qbe
 
     def save_oppoint(self):
         Ib = self.oppoint['Ib']
@@ -459,7 +472,10 @@ class BJT():
     # TODO: get_hb_params() is a temporary implementations to test
     #       the harmonic balance algorithm. Eventually the complete
     #       BJT model should be used.
-    def get_hb_params(self, Vb, Vc, Ve, Vs, s, Vbold, Vcold, Veold):
+    # The terminal voltages are arrays with all the time samples of the
+    # harmonic balance waveforms and every returned value is an array of
+    # the same size, so the model is evaluated once per HB iteration.
+    def get_hb_params(self, Vb, Vc, Ve, Vs, Vbold, Vcold, Veold):
         Vt  = k * self.options['Temp'] / e
         Is  = self.adjusted_options['Is'] 
         Nf  = self.options['Nf'] 
@@ -546,12 +562,13 @@ class BJT():
         Cbcdep = pn_capacitance(Vbc, Cjc, Vjc, Mjc, Fc)
         Qbc = pn_charge(Vbc, Cjc, Vjc, Mjc, Fc)
 
-        if Vsc <= 0:
-            Cscdep = Cjs * np.power((1. - (Vsc / Vjs)), -Mjs)
-            Qsc = Cjs * Vjs / (1 - Mjs) * (1 - np.power(1. - Vsc / Vjs, 1. - Mjs))
-        else:
-            Cscdep = Cjs * (1. + Mjs * Vsc / Vjs)
-            Qsc = Cjs * Vsc / (1 + (Mjs * Vsc) / (2. * Vjs))
+        Vscrev = np.minimum(Vsc, 0.)
+        Cscdep = np.where(Vsc <= 0,
+                          Cjs * np.power((1. - (Vscrev / Vjs)), -Mjs),
+                          Cjs * (1. + Mjs * Vsc / Vjs))
+        Qsc = np.where(Vsc <= 0,
+                       Cjs * Vjs / (1 - Mjs) * (1 - np.power(1. - Vscrev / Vjs, 1. - Mjs)),
+                       Cjs * Vsc / (1 + (Mjs * Vsc) / (2. * Vjs)))
 
         Tff = Tf * (1. + Xtf * np.square(If / (If + Itf)) * exp_lim(Vbc / (1.44 * Vtf)))
         dTff_dVbe = (Tf * Xtf * 2 * gif * If * Itf / (If + Itf)**3) * exp_lim(Vbc / (1.44 * Vtf))
@@ -586,26 +603,27 @@ class BJT():
 
 # limit the maximum derivative of the exponential function
 def exp_lim(x):
-    return np.exp(x) if x < 200. else np.exp(200.) + np.exp(200.) * (x - 200.)
+    # works for scalars and for arrays of time samples
+    xlim = np.minimum(x, 200.)
+    return np.exp(xlim) * (1. + (x - xlim))
 
 def pn_capacitance(Vpn, Cj, Vj, Mj, Fc):
-    if Vpn <= Fc * Vj:
-        C = Cj * np.power((1. - (Vpn / Vj)), -Mj)
-    else:
-        C = Cj / np.power((1. - Fc), Mj) * (1. + Mj * (Vpn - Fc * Vj) / (Vj * (1. - Fc)))
+    # both regions are evaluated so that Vpn can be an array of time samples
+    Vdep = np.minimum(Vpn, Fc * Vj)
+    Cdep = Cj * np.power((1. - (Vdep / Vj)), -Mj)
+    Cfwd = Cj / np.power((1. - Fc), Mj) * (1. + Mj * (Vpn - Fc * Vj) / (Vj * (1. - Fc)))
 
-    return C
+    return np.where(Vpn <= Fc * Vj, Cdep, Cfwd)
 
 def pn_charge(Vpn, Cj, Vj, Mj, Fc):
-    if Vpn <= Fc * Vj:
-        Q = Cj * Vj / (1. - Mj) * (1. - np.power((1. - Vpn / Vj), (1. - Mj)))
-    else:
-        X = (1. - np.power((1. - Fc), (1. - Mj))) / (1. - Mj) + \
-            (1. - Fc * (1. + Mj)) / np.power((1. - Fc), (1. + Mj)) * (Vpn / Vj - Fc) + \
-            Mj / (2. * np.power((1. - Fc), (1. + Mj))) * (np.square(Vpn / Vj) - np.square(Fc))
-        Q = Cj * Vj * X
-
-    return Q
+    Vdep = np.minimum(Vpn, Fc * Vj)
+    Qdep = Cj * Vj / (1. - Mj) * (1. - np.power((1. - Vdep / Vj), (1. - Mj)))
+    X = (1. - np.power((1. - Fc), (1. - Mj))) / (1. - Mj) + \
+        (1. - Fc * (1. + Mj)) / np.power((1. - Fc), (1. + Mj)) * (Vpn / Vj - Fc) + \
+        Mj / (2. * np.power((1. - Fc), (1. + Mj))) * (np.square(Vpn / Vj) - np.square(Fc))
+    Qfwd = Cj * Vj * X
+
+    return np.where(Vpn <= Fc * Vj, Qdep, Qfwd)
 
 """
 
@@ -33,6 +33,24 @@ class CubicNonLinearity():
         z[self.n1] = z[self.n1] - Ieq
         z[self.n2] = z[self.n2] + Ieq
 
+    def add_hb_stamps(self, v, vold, i, q, g, c):
+        # Harmonic balance stamps for all the time samples at once: v and
+        # vold hold the node voltages of this and the previous iteration
+        # (row 0 is 'gnd'), the device currents and charges are added to i
+        # and q, and their derivatives to the node pair waveforms g and c.
+        n1 = self.n1
+        n2 = self.n2
+
+        gv, Iv = self.get_mthb_params(v[n1] - v[n2], vold[n1] - vold[n2])
+
+        g[n1,n1] += gv
+        g[n2,n2] += gv
+        g[n1,n2] -= gv
+        g[n2,n1] -= gv
+
+        i[n1] += Iv
+        i[n2] -= Iv
+
     def get_mthb_params(self, V, Vold):
         g = 2 * self.alpha * V*V
         I = self.alpha * V*V*V
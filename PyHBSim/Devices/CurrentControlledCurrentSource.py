@@ -1,3 +1,5 @@
+import numpy as np
+
 class CurrentControlledCurrentSource():
     
     def __init__(self, name, n1, n2, n3, n4, G=1, tau=0):
@@ -39,6 +41,24 @@ class CurrentControlledCurrentSource():
     def add_tran_stamps(self, A, z, x, iidx, xt, t, tstep):
         self.add_dc_stamps(A, z, x, iidx)
 
+    def get_mna_stamps(self, iidx):
+        # constant stamps G + s C of the MNA matrix (see StampPlan), a
+        # delayed source is stamped at each frequency instead
+        if self.tau != 0.:
+            return None
+        G = self.G
+        rows = [iidx, iidx, self.n1, self.n2, self.n3, self.n4]
+        cols = [self.n1, self.n4, iidx, iidx, iidx, iidx]
+        return rows, cols, [1., -1., 1., G, -G, -1.], [0.] * 6
+
+    def get_mthb_admittance(self, freqs, iidx):
+        # same stamps as add_ac_stamps() over the frequency grid
+        G = self.G * np.exp(-1j * 2. * np.pi * freqs * self.tau)
+        one = np.ones(len(freqs), dtype=complex)
+        rows = [iidx, iidx, self.n1, self.n2, self.n3, self.n4]
+        cols = [self.n1, self.n4, iidx, iidx, iidx, iidx]
+        return rows, cols, np.array([one, -one, one, G, -G, -one])
+
     def __str__(self):
         return 'CCCS: {}\nNodes = {} -> {} and {}->{}\nG = {}\ndelay={}\n'.format(self.name, self.n1, self.n2, self.n3, self.n4, self.G, self.tau)
 
@@ -33,6 +33,10 @@ class CurrentSource():
 
     def add_tran_stamps(self, A, z, x, iidx, xt, t, tstep):
         self.add_dc_stamps(A, z, x, iidx)
+        if self.itype != 'dc' and self.freq > 0: # sinusoid with the same phasor used by AC and HB
+            i = self.ac * np.cos(2. * np.pi * self.freq * t + self.phase)
+            z[self.n1] = z[self.n1] + i
+            z[self.n2] = z[self.n2] - i
 
     def __str__(self):
         return 'Current Source: {}\nNodes = {} -> {}\nIdc = {}\nIac = {}\nPhase = {}'.format(self.name,
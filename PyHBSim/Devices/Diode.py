@@ -166,26 +166,25 @@ class Diode():
         z[self.n1] = z[self.n1] - self.It
         z[self.n2] = z[self.n2] + self.It
 
-    def add_hb_stamps(self, v, i, g, k):
+    def add_hb_stamps(self, v, vold, i, q, g, c):
+        # Harmonic balance stamps for all the time samples at once: v and
+        # vold hold the node voltages of this and the previous iteration
+        # (row 0 is 'gnd'), the device currents and charges are added to i
+        # and q, and their derivatives to the node pair waveforms g and c.
         n1 = self.n1
         n2 = self.n2
 
-        # calculate current over the diode
-        v1 = v[n1-1,k] if n1 > 0 else 0
-        v2 = v[n2-1,k] if n2 > 0 else 0
-        Vd = v1 - v2
+        Vd = v[n1] - v[n2]
+        Vdold = vold[n1] - vold[n2]
+        gd, Id = self.get_mthb_params(Vd, Vdold)
 
-        # TODO: verify the need for voltage limiting
-        Id = self.get_i(Vd, 0)
-        gd = self.get_g(Vd, 0)
+        g[n1,n1] += gd
+        g[n2,n2] += gd
+        g[n1,n2] -= gd
+        g[n2,n1] -= gd
 
-        g[n1,n1,k] = g[n1,n1,k] + gd
-        g[n2,n2,k] = g[n2,n2,k] + gd
-        g[n1,n2,k] = g[n1,n2,k] - gd
-        g[n2,n1,k] = g[n2,n1,k] - gd
-
-        i[n1,k] = i[n1,k] + Id
-        i[n2,k] = i[n2,k] - Id
+        i[n1] += Id
+        i[n2] -= Id
 
     def save_oppoint(self):
         # store operating point information needed for transient simulation
@@ -331,67 +330,8 @@ class Diode():
 
         return Vd
 
-    # TODO: get_i() and get_g() are temporary implementations
-    #       to test the harmonic balance algorithm. Eventually
-    #       the complete diode model should be used.
-    def get_i(self, Vd, Vdold=0):
-        Is = self.adjusted_options['Is']
-        N = self.options['N']
-        Isr = self.adjusted_options['Isr']
-        Nr = self.options['Nr']
-        Ikf = self.adjusted_options['Ikf']
-        Bv = self.options['Bv']
-        Ibv = self.adjusted_options['Ibv']
-        Rs = self.adjusted_options['Rs']
-        T = self.options['Temp']
-        Vt = k * T / e
-
-        # Vd = Vdold + 10. * N * Vt * np.tanh((Vd - Vdold) / (10. * N * Vt))
-
-        Idf = Is * (exp_lim(Vd / (N * Vt)) - 1.)
-        Idr = Isr * (exp_lim(Vd / (Nr * Vt)) - 1.)
-
-        if isfinite(Ikf):
-            Idf = Idf * np.sqrt(Ikf / (Ikf + Idf))
-
-        Ibr = 0.
-        if isfinite(Bv):
-            Ibr = Ibv * exp_lim(- Bv / Vt) * (1. - exp_lim(- Vd / Vt))
-
-        # diode total current
-        Id = Idf + Idr + Ibr# + (Vd * 1e-12)
-
-        return Id - gd * Id
-
-    def get_g(self, Vd, Vdold=0):
-        Is = self.adjusted_options['Is']
-        N = self.options['N']
-        Isr = self.adjusted_options['Isr']
-        Nr = self.options['Nr']
-        Ikf = self.adjusted_options['Ikf']
-        Bv = self.options['Bv']
-        Ibv = self.adjusted_options['Ibv']
-        Rs = self.adjusted_options['Rs']
-        T = self.options['Temp']
-        Vt = k * T / e
-
-        # Vd = Vdold + 10. * N * Vt * np.tanh((Vd - Vdold) / (10. * N * Vt))
-
-        gdf = Is / (N * Vt) * exp_lim(Vd / (N * Vt))
-        gdr = Isr / (Nr * Vt) * exp_lim(Vd / (Nr * Vt))
-
-        if isfinite(Ikf):
-            gdf = gdf * (1. - 0.5 * Idf / (Ikf + Idf)) * np.sqrt(Ikf / (Ikf + Idf))
-        gbr = 0.
-
-        if isfinite(Bv):
-            gbr = Ibv / Vt * exp_lim(- (Bv + Vd) / Vt)
-
-        # diode total conductance
-        gd = gdf + gdr + gbr
-
-        return gd
-
+    # Vd and Vdold can be arrays with all the time samples of the harmonic
+    # balance waveforms. Currents and conductances are returned as arrays.
     def get_mthb_params(self, Vd, Vdold):
         Is = self.options['Is']
         N = self.options['N']
@@ -432,7 +372,9 @@ class Diode():
 # limit the maximum derivative of the exponential function
 # TODO: improve this to a quadratic approximation
 def exp_lim(x):
-    return np.exp(x) if x < 200. else np.exp(200.) + np.exp(200.) * (x - 200.)
+    # works for scalars and for arrays of time samples
+    xlim = np.minimum(x, 200.)
+    return np.exp(xlim) * (1. + (x - xlim))
 
 """
 
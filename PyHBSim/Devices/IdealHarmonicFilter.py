@@ -30,31 +30,14 @@ class IdealHarmonicFilter():
         A[self.n1][self.n2] = A[self.n1][self.n2] - g
         A[self.n2][self.n1] = A[self.n2][self.n1] - g
 
-    def add_mthb_stamps(self, Y, S, freq, freqidx):
+    def get_mthb_admittance(self, freqs):
+        # admittance over the (positive) frequency grid, freqs[0] is DC
         gmin = 1e-12 # conductance of open harmonics
-        if freqidx == 0:
-            n = (self.n1 - 1) * S
-            m = (self.n2 - 1) * S
-            y = gmin
-            if (self.n1 > 0):
-                Y[n,n] += y
-            if (self.n2 > 0):
-                Y[m,m] += y
-            if (self.n1 > 0 and self.n2 > 0):
-                Y[n,m] -= y
-                Y[m,n] -= y
-        else:
-            y = self.g if freq == self.freq else gmin
-            n = (self.n1 - 1) * S + 2 * (freqidx - 1) + 1
-            m = (self.n2 - 1) * S + 2 * (freqidx - 1) + 1
-            Ymnk = np.array([[y, 0],[0, y]])
-            if (self.n1 > 0):
-                Y[n:n+2,n:n+2] += Ymnk 
-            if (self.n2 > 0):
-                Y[m:m+2,m:m+2] += Ymnk 
-            if (self.n1 > 0 and self.n2 > 0):
-                Y[n:n+2,m:m+2] -= Ymnk 
-                Y[m:m+2,n:n+2] -= Ymnk 
+        y = np.where(freqs == self.freq, self.g, gmin).astype(complex)
+        y[0] = gmin
+        rows = [self.n1, self.n2, self.n1, self.n2]
+        cols = [self.n1, self.n2, self.n2, self.n1]
+        return rows, cols, np.outer([1., 1., -1., -1.], y)
 
     def add_tran_stamps(self, A, z, x, iidx, xt, t, tstep):
         self.add_dc_stamps(A, z, x, iidx)
@@ -61,30 +61,21 @@ class Inductor():
         A[iidx][iidx] = -1.0
         z[iidx] = z[iidx] - Ieq
 
-    def add_mthb_stamps(self, Y, S, freq, freqidx):
-        if freqidx == 0:
-            n = (self.n1 - 1) * S
-            m = (self.n2 - 1) * S
-            y = 1e6
-            if (self.n1 > 0):
-                Y[n,n] += y
-            if (self.n2 > 0):
-                Y[m,m] += y
-            if (self.n1 > 0 and self.n2 > 0):
-                Y[n,m] -= y
-                Y[m,n] -= y
-        else:
-            n = (self.n1 - 1) * S + 2 * (freqidx - 1) + 1
-            m = (self.n2 - 1) * S + 2 * (freqidx - 1) + 1
-            y = 1. / (1j * 2 * np.pi * freq * self.L)
-            Ymnk = np.array([[y.real, -y.imag],[y.imag, y.real]])
-            if (self.n1 > 0):
-                Y[n:n+2,n:n+2] += Ymnk 
-            if (self.n2 > 0):
-                Y[m:m+2,m:m+2] += Ymnk 
-            if (self.n1 > 0 and self.n2 > 0):
-                Y[n:n+2,m:m+2] -= Ymnk 
-                Y[m:m+2,n:n+2] -= Ymnk 
+    def get_mna_stamps(self, iidx):
+        # constant stamps G + s C of the MNA matrix (see StampPlan), the
+        # branch equation is V(n1) - V(n2) - s L I = 0
+        rows = [self.n1, self.n2, iidx, iidx, iidx]
+        cols = [iidx, iidx, self.n1, self.n2, iidx]
+        return rows, cols, [1., -1., 1., -1., 0.], [0., 0., 0., 0., -self.L]
+
+    def get_mthb_admittance(self, freqs, iidx):
+        # branch current 'iidx' with V(n1) - V(n2) = jwL I, which is an
+        # exact short at DC
+        z = 1j * 2 * np.pi * freqs * self.L
+        one = np.ones(len(freqs), dtype=complex)
+        rows = [self.n1, self.n2, iidx, iidx, iidx]
+        cols = [iidx, iidx, self.n1, self.n2, iidx]
+        return rows, cols, np.array([one, -one, one, -one, -z])
 
     def __str__(self):
         return 'Inductor: {}\nNodes = {} -> {}\nValue = {}\n'.format(self.name, self.n1, self.n2, self.L)
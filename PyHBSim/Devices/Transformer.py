@@ -35,9 +35,19 @@ class Transformer():
     def add_tran_stamps(self, A, z, x, iidx, xt, t, tstep):
         self.add_dc_stamps(A, z, x, iidx)
         
-    def add_mthb_stamps(self, Y, S, freq, freqidx):
-        # TODO
-        pass
+    def get_mna_stamps(self, iidx):
+        # constant stamps G + s C of the MNA matrix (see StampPlan)
+        rows = [self.n1, self.n2, self.n3, self.n4, iidx, iidx, iidx, iidx]
+        cols = [iidx, iidx, iidx, iidx, self.n1, self.n2, self.n3, self.n4]
+        return rows, cols, [-1., self.T, -self.T, 1., 1., -self.T, self.T, -1.], [0.] * 8
+
+    def get_mthb_admittance(self, freqs, iidx):
+        # same stamps as add_dc_stamps(), the ideal transformer does not
+        # depend on the frequency
+        y = np.ones(len(freqs), dtype=complex)
+        rows = [self.n1, self.n2, self.n3, self.n4, iidx, iidx, iidx, iidx]
+        cols = [iidx, iidx, iidx, iidx, self.n1, self.n2, self.n3, self.n4]
+        return rows, cols, np.outer([-1., self.T, -self.T, 1., 1., -self.T, self.T, -1.], y)
 
     def __str__(self):
         return 'Transformer: {}\nNodes = {} -> {} and {}->{}\nT = {}\n'.format(self.name, self.n1, self.n2, self.n3, self.n4, self.T)
@@ -78,6 +78,14 @@ class TransientVoltageSource():
             else:
                 z[iidx] = self.v1
 
+    def get_mthb_admittance(self, freqs, iidx):
+        # branch current 'iidx' with V(n1) - V(n2) set by the source (see
+        # the source vector of the HB analysis)
+        y = np.ones(len(freqs), dtype=complex)
+        rows = [self.n1, self.n2, iidx, iidx]
+        cols = [iidx, iidx, self.n1, self.n2]
+        return rows, cols, np.outer([1., -1., 1., -1.], y)
+
     def __str__(self):
         if self.vtype == 'sine':
             return 'Sinusoidal Source: {}\nNodes: {} -> {}\nVdc = {}\nVac = {}\nFreq = {}\nPhase = {}'.format(self.name,
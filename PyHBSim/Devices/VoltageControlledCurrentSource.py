@@ -1,3 +1,5 @@
+import numpy as np
+
 class VoltageControlledCurrentSource():
     
     def __init__(self, name, n1, n2, n3, n4, G=1, tau=0):
@@ -19,22 +21,39 @@ class VoltageControlledCurrentSource():
         pass
 
     def add_dc_stamps(self, A, z, x, iidx):
-        A[self.n2][self.n1] = A[self.n3][self.n1] + self.G
-        A[self.n2][self.n4] = A[self.n3][self.n1] - self.G
+        A[self.n2][self.n1] = A[self.n2][self.n1] + self.G
+        A[self.n2][self.n4] = A[self.n2][self.n4] - self.G
         A[self.n3][self.n1] = A[self.n3][self.n1] - self.G
-        A[self.n3][self.n4] = A[self.n3][self.n1] + self.G
+        A[self.n3][self.n4] = A[self.n3][self.n4] + self.G
 
     def add_ac_stamps(self, A, z, x, iidx, freq):
         G = self.G * np.exp(-1j * 2. * np.pi * freq * self.tau)
-        A[self.n2][self.n1] = A[self.n3][self.n1] + G
-        A[self.n2][self.n4] = A[self.n3][self.n1] - G
+        A[self.n2][self.n1] = A[self.n2][self.n1] + G
+        A[self.n2][self.n4] = A[self.n2][self.n4] - G
         A[self.n3][self.n1] = A[self.n3][self.n1] - G
-        A[self.n3][self.n4] = A[self.n3][self.n1] + G
+        A[self.n3][self.n4] = A[self.n3][self.n4] + G
 
     # TODO: implement transient time delay
     def add_tran_stamps(self, A, z, x, iidx, xt, t, tstep):
         self.add_dc_stamps(A, z, x, iidx)
 
+    def get_mna_stamps(self, iidx):
+        # constant stamps G + s C of the MNA matrix (see StampPlan), a
+        # delayed source is stamped at each frequency instead
+        if self.tau != 0.:
+            return None
+        G = self.G
+        rows = [self.n2, self.n2, self.n3, self.n3]
+        cols = [self.n1, self.n4, self.n1, self.n4]
+        return rows, cols, [G, -G, -G, G], [0.] * 4
+
+    def get_mthb_admittance(self, freqs):
+        # output current G * (V(n1) - V(n4)) from n2 to n3
+        G = self.G * np.exp(-1j * 2. * np.pi * freqs * self.tau)
+        rows = [self.n2, self.n2, self.n3, self.n3]
+        cols = [self.n1, self.n4, self.n1, self.n4]
+        return rows, cols, np.array([G, -G, -G, G])
+
     def __str__(self):
         return 'VCCS: {}\nNodes = {} -> {} and {}->{}\nG = {}\ndelay={}\n'.format(self.name, self.n1, self.n2, self.n3, self.n4, self.G, self.tau)
 
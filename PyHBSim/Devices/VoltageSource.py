@@ -2,7 +2,7 @@ import numpy as np
 
 class VoltageSource():
     
-    def __init__(self, name, n1, n2, dc=0, ac=0, phase=0, vtype=None):
+    def __init__(self, name, n1, n2, dc=0, ac=0, phase=0, freq=0, vtype=None):
         self.name = name
         self.n1 = n1
         self.n2 = n2
@@ -10,6 +10,7 @@ class VoltageSource():
         self.dc = float(dc)
         self.ac = float(ac)
         self.phase = np.radians(float(phase))
+        self.freq = float(freq)
 
     def get_num_vsources(self):
         return 1
@@ -44,6 +45,16 @@ class VoltageSource():
 
     def add_tran_stamps(self, A, z, x, iidx, xt, t, tstep):
         self.add_dc_stamps(A, z, x, iidx)
+        if self.vtype != 'dc' and self.freq > 0: # sinusoid with the same phasor used by AC and HB
+            z[iidx] = z[iidx] + self.ac * np.cos(2. * np.pi * self.freq * t + self.phase)
+
+    def get_mthb_admittance(self, freqs, iidx):
+        # branch current 'iidx' with V(n1) - V(n2) set by the source (see
+        # the source vector of the HB analysis)
+        y = np.ones(len(freqs), dtype=complex)
+        rows = [self.n1, self.n2, iidx, iidx]
+        cols = [iidx, iidx, self.n1, self.n2]
+        return rows, cols, np.outer([1., -1., 1., -1.], y)
 
     def __str__(self):
         return 'Voltage Source: {}\nNodes: {} -> {}\nVdc = {}\nVac = {}\nPhase = {}'.format(self.name,
@@ -168,7 +168,7 @@ class Netlist():
         self.devices.append(idc)
         return idc
 
-    def add_vac(self, name, n1, n2, ac, phase=0):
+    def add_vac(self, name, n1, n2, ac, phase=0, freq=0):
         """
         Add AC voltage source to the netlist.
 
@@ -184,6 +184,8 @@ class Netlist():
             AC voltage value in Volts.
         phase : float
             Phase of the AC voltage source
+        freq : float
+            Frequency of the fundamental for HB analysis
 
         Returns
         -------
@@ -194,7 +196,7 @@ class Netlist():
         n1 = self.add_node(n1)
         n2 = self.add_node(n2)
         
-        vac = VoltageSource(name, n1, n2, vtype='ac', ac=ac, phase=phase)
+        vac = VoltageSource(name, n1, n2, vtype='ac', ac=ac, phase=phase, freq=freq)
         self.devices.append(vac)
         return vac
 
@@ -230,7 +232,7 @@ class Netlist():
         self.devices.append(iac)
         return iac
 
-    def add_vsource(self, name, n1, n2, dc, ac, phase=0):
+    def add_vsource(self, name, n1, n2, dc, ac, phase=0, freq=0):
         """
         Add a voltage source to the netlist with DC and AC values.
 
@@ -248,6 +250,8 @@ class Netlist():
             AC voltage value in Volts.
         phase : float
             Phase of the AC voltage source
+        freq : float
+            Frequency of the fundamental for HB analysis
 
         Returns
         -------
@@ -258,11 +262,11 @@ class Netlist():
         n1 = self.add_node(n1)
         n2 = self.add_node(n2)
         
-        vsource = VoltageSource(name, n1, n2, dc, ac, phase, vtype='both')
+        vsource = VoltageSource(name, n1, n2, dc, ac, phase, freq, vtype='both')
         self.devices.append(vsource)
         return vsource
 
-    def add_isource(self, name, n1, n2, dc, ac, phase=0):
+    def add_isource(self, name, n1, n2, dc, ac, phase=0, freq=0):
         """
         Add a current source to the netlist with DC and AC values.
 
@@ -280,6 +284,8 @@ class Netlist():
             AC current value in Amperes.
         phase : float
             Phase of the AC current source
+        freq : float
+            Frequency of the fundamental for HB analysis
 
         Returns
         -------
@@ -290,7 +296,7 @@ class Netlist():
         n1 = self.add_node(n1)
         n2 = self.add_node(n2)
         
-        isource = CurrentSource(name, n1, n2, dc, ac, phase, itype='both')
+        isource = CurrentSource(name, n1, n2, dc, ac, phase, freq, itype='both')
         self.devices.append(isource)
         return isource
 
@@ -81,12 +81,16 @@ class PyHBSim(Netlist):
         stop : float
             Stop frequency.
         numpts : int
-            Number of points in the sweep between start and stop.
+            Number of points in the sweep between start and stop. In the
+            adaptive sweep it is the number of points of the initial grid.
         stepsize : float
             Difference between two subsequent frequency points. Only available
             in linear sweep. It defines the number of points in the sweep.
         sweeptype : str
-            Type of sweep to be performed. Possible values are: linear, logarithm.
+            Type of sweep to be performed. Possible values are: linear,
+            logarithm, adaptive. The adaptive sweep adds points where the
+            response changes fast, the resulting frequencies are returned
+            by get_freqs.
 
         Returns
         -------
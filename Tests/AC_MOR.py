@@ -0,0 +1,62 @@
+import numpy as np
+
+import setup
+from PyHBSim import PyHBSim
+
+# The reduced order model sweep (sweep_method = 'mor') has to match the
+# direct sweep when the small-signal circuit is of the form G + s C, and
+# fall back to the direct sweep when it is not (delayed sources).
+
+def bjt_testbench():
+    y = PyHBSim('BJT MOR Testbench')
+
+    v1 = y.add_vdc('V1', 'nvcc', 'gnd', 5)
+    r1 = y.add_resistor('R1', 'nvcc', 'nc', 1e3)
+
+    c1 = y.add_capacitor('C1', 'ny', 'nb', 1e-6)
+    i1 = y.add_iac('I1', 'ny', 'gnd', 1e-3)
+
+    l1 = y.add_inductor('L1', 'nx', 'nb', 1e-3)
+    v2 = y.add_vdc('V2', 'nx', 'gnd', 0.75)
+
+    q1 = y.add_bjt('Q1', 'nb', 'nc', 'gnd')
+    q1.options['Is'] = 8.11e-14
+    q1.options['Bf'] = 205
+    q1.options['Br'] = 4
+    q1.options['Vaf'] = 113
+    q1.options['Cje'] = 2.95e-11
+    q1.options['Cjc'] = 1.52e-11
+    q1.options['Cjs'] = 0.
+    return y
+
+def delay_testbench():
+    y = PyHBSim('Delayed VCCS MOR Testbench')
+
+    v1 = y.add_vac('V1', 'n1', 'gnd', ac=1.)
+    r1 = y.add_resistor('R1', 'n1', 'n2', 1e3)
+    c1 = y.add_capacitor('C1', 'n2', 'gnd', 1e-12)
+
+    g1 = y.add_vccs('G1', 'n2', 'gnd', 'n3', 'gnd', 1e-3, tau=1e-9)
+    r2 = y.add_resistor('R2', 'n3', 'gnd', 1e3)
+    c2 = y.add_capacitor('C2', 'n3', 'gnd', 1e-12)
+    return y
+
+def sweep(testbench, method, start, stop):
+    y = testbench()
+    xdc = y.run(y.add_dc_analysis('DC1').name)
+    ac1 = y.add_ac_analysis('AC1', start=start, stop=stop, numpts=200, sweeptype='logarithm')
+    ac1.options['sweep_method'] = method
+    y.run('AC1', xdc)
+    return ac1, y
+
+for testbench, node, start, stop, fallback in [(bjt_testbench, 'nc', 1e3, 10e9, False),
+                                               (delay_testbench, 'n3', 1e3, 1e9, True)]:
+    _, direct = sweep(testbench, 'direct', start, stop)
+    ac1, mor = sweep(testbench, 'mor', start, stop)
+
+    v = direct.get_voltage('AC1', node)
+    err = np.max(np.abs(mor.get_voltage('AC1', node) - v)) / np.max(np.abs(v))
+    print('{}: {} expansion points, relative difference to the direct sweep {:.2e}'.format(
+        direct.name, len(ac1.expansion_points), err))
+    assert (len(ac1.expansion_points) == 0) == fallback
+    assert err < 1e-6
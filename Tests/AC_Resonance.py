@@ -0,0 +1,31 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+import setup
+from PyHBSim import PyHBSim
+
+y = PyHBSim("Hello World!")
+
+# series resonator with Q ~ 1000 at 1 MHz, much narrower than the initial grid
+y.add_vsource('V1', 'n1', 'gnd', dc=0, ac=1)
+y.add_resistor('R1', 'n1', 'n2', 0.0628)
+y.add_inductor('L1', 'n2', 'n3', 10e-6)
+y.add_capacitor('C1', 'n3', 'gnd', 2.5e-9)
+
+ac = y.add_ac_analysis('AC1', start=1e3, stop=1e9, numpts=10, sweeptype='adaptive')
+
+sol = y.run('AC1')
+
+freq = y.get_freqs('AC1')
+vout = y.get_voltage('AC1', 'n3')
+
+print('Number of frequencies: {}'.format(len(freq)))
+print('Peak of {:.2f} V at {:.6g} Hz'.format(np.max(np.abs(vout)), freq[np.argmax(np.abs(vout))]))
+
+plt.figure(1)
+plt.loglog(freq, np.abs(vout), '.-')
+plt.grid()
+plt.title('Adaptive AC Simulation')
+plt.xlabel('Frequencies')
+plt.ylabel('Vout')
+plt.show()
@@ -6,6 +6,7 @@ from scipy import optimize
 import setup
 from PyHBSim import PyHBSim, Netlist
 from PyHBSim.Analyses import AC, MultiToneHarmonicBalance
+from PyHBSim.Analyses.Fourier import time_to_spectrum
 
 # y = Netlist('Oscillator')
 
@@ -97,8 +98,7 @@ for vin in vi:
     V0 = hb.V
 
     # get time-domain waveform from BJT and convert to frequency
-    ic_td = np.array(q1.Ic, dtype=complex)
-    ic_fd = hb.DFT @ ic_td
+    ic_fd = time_to_spectrum(q1.Ic)
     ic[i] = np.abs(ic_fd[1] + 1j * ic_fd[2])
 
     i += 1
@@ -60,6 +60,15 @@ q1.options['Bf'] = 100
 # single iteration
 converged, freqs, Vf, _, _ = hb.run_oscillator(y, f0, numharmonics, V0, 'nc')
 
+# gradient of the efficiency with respect to 'n' from the adjoint
+# sensitivities (no extra HB runs)
+dVf, dfreq = hb.calc_sensitivity([(C1, 'C'), (C2, 'C')], [('nc', 1)])
+dVdn = dVf[0,0] * ct / (1 - n) ** 2 - dVf[0,1] * ct / n ** 2
+vtank = hb.get_v('nc')[1]
+print('Efficiency = {}'.format(np.abs(vtank)**2 / (2 * rl) / (vcc * ibias)))
+print('d(Efficiency)/dn = {}'.format(2 * np.real(np.conj(vtank) * dVdn) / (2 * rl) / (vcc * ibias)))
+print('d(fosc)/dn = {}'.format(dfreq[0] * ct / (1 - n) ** 2 - dfreq[1] * ct / n ** 2))
+
 hb.plot_v('nc')
 hb.plot_v('ne')
 plt.figure()
@@ -0,0 +1,57 @@
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+
+import setup
+from PyHBSim import PyHBSim, Netlist
+from PyHBSim.Analyses import MultiToneHarmonicBalance, Sweep
+
+
+y = Netlist('Oscillator')
+
+# circuit parameters
+vcc = 10
+r = 200e3
+l = 0.5e-3
+c = 10e-9
+re = 50e3
+freq = 0
+
+# VCC
+y.add_idc('I1', 'nx', 'gnd', dc=vcc)
+y.add_gyrator('G1', 'nx', 'nvcc', 'gnd', 'gnd', 1)
+
+# tank circuit
+y.add_resistor('R1', 'nvcc', 'nb', r)
+y.add_inductor('L1', 'nvcc', 'nb', l)
+C1 = y.add_capacitor('C1', 'nvcc', 'nb', c)
+
+# emitter resistance
+y.add_resistor('RE', 'ne', 'gnd', re)
+
+# bjts
+q1 = y.add_bjt('Q1', 'nb', 'nvcc', 'ne')
+q2 = y.add_bjt('Q2', 'nvcc', 'nb', 'ne')
+
+q1.options['Is'] = 1e-16
+q1.options['Bf'] = 200
+q1.options['Br'] = 1
+q2.options = q1.options.copy()
+
+numharmonics = 10
+freq = 80e3
+V0 = 0.1
+
+# sweep the tank capacitance, each point is predicted from the previous ones
+hb = MultiToneHarmonicBalance('HB1')
+sw = Sweep('SW1', hb, C1, 'C', np.linspace(10e-9, 20e-9, 11))
+
+converged, values, freqs, Vf = sw.run_oscillator(y, freq, numharmonics, V0, 'nb')
+
+fig, ax = plt.subplots(2, 1, sharex=True)
+ax[0].plot(values * 1e9, sw.fosc * 1e-3, 'o-')
+ax[0].set_ylabel('Frequency (kHz)')
+ax[1].plot(values * 1e9, np.abs(sw.get_v('nb')[:,1]), 'o-')
+ax[1].set_ylabel('|V(nb)| fundamental (V)')
+ax[1].set_xlabel('C1 (nF)')
+plt.show()
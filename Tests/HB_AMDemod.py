@@ -30,6 +30,7 @@ begin = time.time()
 hb = MultiToneHarmonicBalance('HB1', [1e6, 10e3], [10, 10])
 hb.options['reltol'] = 1e-3
 hb.options['abstol'] = 1e-6
+hb.options['initial_guess'] = 'transient'
 
 converged, freqs, Vf, _, _ = hb.run(y)
 
@@ -0,0 +1,42 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+import setup
+from PyHBSim import PyHBSim
+from PyHBSim.Analyses import MultiToneHarmonicBalance
+import time
+
+y = PyHBSim('Controlled Sources Testbench')
+
+v1 = y.add_vac('V1', 'n1', 'gnd', ac=0.2, freq=1.1e6)
+v2 = y.add_vac('V2', 'n2', 'n1', ac=0.2, freq=0.9e6)
+
+# voltage gain, then the current through R1 is sensed and converted back
+# into a voltage, and the current through R2 is copied into R3
+e1 = y.add_vcvs('E1', 'n2', 'n3', 'gnd', 'gnd', 2.)
+r1 = y.add_resistor('R1', 'n3', 'n4', 1e3)
+h1 = y.add_ccvs('H1', 'n4', 'n5', 'gnd', 'gnd', 1e3)
+r2 = y.add_resistor('R2', 'n5', 'n6', 1e3)
+f1 = y.add_cccs('F1', 'n6', 'n7', 'gnd', 'gnd', 1.)
+r3 = y.add_resistor('R3', 'n7', 'gnd', 1e3)
+
+# transconductance stage driving a diode
+g1 = y.add_vccs('G1', 'n7', 'n8', 'gnd', 'gnd', 1e-3)
+r4 = y.add_resistor('R4', 'n8', 'gnd', 1e3)
+d1 = y.add_diode('D1', 'n8', 'gnd')
+
+begin = time.time()
+
+hb = MultiToneHarmonicBalance('HB1', [1.1e6, 0.9e6], [3, 3])
+
+converged, freqs, Vf, _, _ = hb.run(y)
+
+end = time.time()
+
+hb.print_v('n8')
+hb.plot_v('n8')
+plt.show()
+
+print('Running time: {}'.format(end-begin))
+print('HB problem size: {}'.format(hb.V.shape))
+print('Number of frequency bins: {}'.format(freqs.shape))
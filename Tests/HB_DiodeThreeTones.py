@@ -0,0 +1,44 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+import setup
+from PyHBSim import PyHBSim, Netlist
+from PyHBSim.Analyses import MultiToneHarmonicBalance
+import time
+
+y = PyHBSim('Diode Testbench')
+
+i1 = y.add_iac('I1', 'nx', 'gnd', ac=1, freq=1.1e6)
+g1 = y.add_gyrator('G1', 'nx', 'nz', 'gnd', 'gnd', 1)
+
+i2 = y.add_iac('I2', 'ny', 'gnd', ac=1, phase=0.5, freq=0.9e6)
+g2 = y.add_gyrator('G2', 'ny', 'nw', 'nz', 'gnd', 1)
+
+i3 = y.add_iac('I3', 'nu', 'gnd', ac=0.5, freq=1.23e6)
+g3 = y.add_gyrator('G3', 'nu', 'n1', 'nw', 'gnd', 1)
+
+r1 = y.add_resistor('R1', 'n1', 'n2', 100)
+c1 = y.add_capacitor('C1', 'n2', 'gnd', 1e-10)
+d1 = y.add_diode('D1', 'n2', 'gnd')
+
+d1.options['Is'] = 1e-15
+d1.options['N'] = 1
+d1.options['Area'] = 1
+
+begin = time.time()
+
+# diamond truncation: only the mixing products up to order 4
+hb = MultiToneHarmonicBalance('HB1', [1.1e6, 0.9e6, 1.23e6], [4, 4, 4])
+hb.options['truncation'] = 'diamond'
+
+converged, freqs, Vf, _, _ = hb.run(y)
+
+end = time.time()
+
+hb.print_v('n2')
+hb.plot_v('n2')
+plt.show()
+
+print('Running time: {}'.format(end-begin))
+print('HB problem size: {}'.format(hb.V.shape))
+print('Number of frequency bins: {}'.format(freqs.shape))
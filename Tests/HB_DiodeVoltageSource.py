@@ -0,0 +1,31 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+import setup
+from PyHBSim import PyHBSim, Netlist
+from PyHBSim.Analyses import MultiToneHarmonicBalance
+
+y = PyHBSim('Diode Testbench')
+
+v1 = y.add_vac('V1', 'n1', 'gnd', ac=5, freq=1e6)
+
+r1 = y.add_resistor('R1', 'n1', 'n2', 100)
+
+d1 = y.add_diode('D1', 'gnd', 'n2')
+
+d1.options['Is'] = 1e-15
+d1.options['N'] = 1
+d1.options['Area'] = 1
+
+hb = MultiToneHarmonicBalance('HB1', 1e6, 10)
+# evaluate the diode on 4x more time samples to reduce aliasing
+hb.options['oversample'] = 4
+
+converged, freqs, Vf, time, Vt = hb.run(y)
+
+# current through the source (branch unknown of V1)
+print(hb.get_i('V1')[:4])
+
+hb.plot_v('n1')
+hb.plot_v('n2')
+plt.show()
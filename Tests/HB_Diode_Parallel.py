@@ -0,0 +1,45 @@
+import functools
+import numpy as np
+import matplotlib.pyplot as plt
+
+import setup
+from PyHBSim import PyHBSim, Netlist
+from PyHBSim.Analyses import MultiToneHarmonicBalance, Parallel
+
+def diode_testbench(amplitude, Is):
+    # the netlists are built inside the worker processes
+    y = PyHBSim('Diode Testbench')
+
+    i1 = y.add_iac('I1', 'nx', 'gnd', ac=amplitude, freq=1e6)
+    g1 = y.add_gyrator('G1', 'nx', 'n1', 'gnd', 'gnd', 1)
+
+    r1 = y.add_resistor('R1', 'n1', 'n2', 100)
+
+    d1 = y.add_diode('D1', 'gnd', 'n2')
+
+    d1.options['Is'] = Is
+    d1.options['N'] = 1
+    d1.options['Area'] = 1
+
+    return y
+
+if __name__ == '__main__':
+    amplitudes = np.linspace(0.5, 10, 20)
+    corners = [1e-16, 1e-15, 1e-14]
+
+    jobs = [functools.partial(diode_testbench, a, Is) for Is in corners for a in amplitudes]
+
+    hb = MultiToneHarmonicBalance('HB1', 1e6, 10)
+    par = Parallel('PAR1', hb)
+
+    converged, freqs, Vf = par.run(jobs)
+
+    print('Time per job: {}'.format(np.round(par.times, 3)))
+
+    for i, Is in enumerate(corners):
+        v2 = [abs(par.get_v(i * len(amplitudes) + j, 'n2')[1]) for j in range(len(amplitudes))]
+        plt.plot(amplitudes, v2, 'o-', label='Is = {}'.format(Is))
+    plt.xlabel('Amplitude (V)')
+    plt.ylabel('|V(n2)| fundamental (V)')
+    plt.legend()
+    plt.show()
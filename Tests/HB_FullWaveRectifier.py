@@ -47,6 +47,7 @@ d4.options['Area'] = 1
 
 # hb = HarmonicBalance('HB1', 1e6, 10)
 hb = MultiToneHarmonicBalance('HB1', 1e6, 10)
+hb.options['initial_guess'] = 'transient'
 
 converged, freqs, Vf, time, Vt = hb.run(y)
 
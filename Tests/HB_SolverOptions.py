@@ -0,0 +1,50 @@
+import numpy as np
+
+import setup
+from PyHBSim import PyHBSim
+from PyHBSim.Analyses import MultiToneHarmonicBalance
+
+# The linear solver options of the HB Newton ('solver' and
+# 'reuse_jacobian') also drive the continuation that a run without an
+# initial guess starts with, and all of them reach the same solution.
+
+def diode_testbench():
+    y = PyHBSim('Diode Testbench')
+
+    i1 = y.add_iac('I1', 'nx', 'gnd', ac=5, freq=1e6)
+    g1 = y.add_gyrator('G1', 'nx', 'n1', 'gnd', 'gnd', 1)
+
+    r1 = y.add_resistor('R1', 'n1', 'n2', 100)
+
+    d1 = y.add_diode('D1', 'gnd', 'n2')
+
+    d1.options['Is'] = 1e-15
+    d1.options['N'] = 1
+    d1.options['Area'] = 1
+    return y
+
+settings = {'lu': {},
+            'gmres': {'solver': 'gmres'},
+            'reuse': {'reuse_jacobian': True}}
+
+results = {}
+for name, opts in settings.items():
+    hb = MultiToneHarmonicBalance('HB1', 1e6, 10)
+    hb.options.update(opts)
+    converged, freqs, Vf, _, _ = hb.run(diode_testbench())
+    assert converged, name
+    results[name] = (hb, hb.get_v('n2'))
+
+hb, _ = results['gmres']
+print('GMRES iterations: {}'.format(sum(hb.krylov_iterations)))
+assert sum(hb.krylov_iterations) > 0
+
+hb, _ = results['reuse']
+print('LU factorizations: {} for {} NR iterations'.format(hb.num_factorizations, hb.nr_iterations))
+assert 0 < hb.num_factorizations < hb.nr_iterations
+
+v = results['lu'][1]
+for name in ['gmres', 'reuse']:
+    err = np.max(np.abs(results[name][1] - v)) / np.max(np.abs(v))
+    print('{}: relative difference to the LU solution {:.2e}'.format(name, err))
+    assert err < 1e-3